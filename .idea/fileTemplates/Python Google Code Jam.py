@@ -1,9 +1,13 @@
 import os
 import unittest
 import sys
-import time
 from io import StringIO
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from codejam import runner
+from codejam.output import FixtureComparator
+from codejam.tokens import tokenize
+
 
 # Set NR to  "A", "B" or "C"
 NR = "A"
@@ -15,6 +19,15 @@ NR = "A"
 
 # noinspection PyPep8Naming
 class Test(unittest.TestCase):
+    def _check_fixture(self, do_file, **kw):
+        """Solve the small practice input with ``do_file`` and compare it with the fixture."""
+        f_in_name = file_name("in")
+        f_out_name = file_name("out")
+        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
+            self.skipTest("Both small in and out should be present")
+        with open(f_in_name) as f_in, open(f_out_name) as fixture, FixtureComparator(fixture) as f_out:
+            do_file(f_in, f_out, **kw)
+
     def test_base(self):
         self.assertTrue(False)
 
@@ -23,7 +36,7 @@ class Test(unittest.TestCase):
         Cut and paste here one
         test case from webpage
         """
-        si = StringIO(INPUT.strip())
+        si = tokenize(StringIO(INPUT.strip()))
         data = parse_test_case(si)
         self.fail("Write your asserts about data")
 
@@ -41,18 +54,10 @@ class Test(unittest.TestCase):
         self.assertEqual(so.getvalue().strip(), OUTPUT.strip())
 
     def test_solution(self):
-        f_in_name = file_name("in")
-        f_out_name = file_name("out")
-        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
-            self.skipTest("Both small in and out should be present")
-        f_in = open(f_in_name)
-        f_out = StringIO()
-        do(f_in, f_out)
-        with open(f_out_name) as fixture:
-            self.assertEqual(f_out.getvalue(), fixture.read())
+        self._check_fixture(do)
 
 
-def parse_test_case(f_in):
+def parse_test_case(tokens):
     raise NotImplementedError()
 
 
@@ -61,71 +66,20 @@ def do_single(case):
 
 
 def get_test_cases(f_in):
-    tests = int(f_in.readline())
-    return [parse_test_case(f_in) for _ in range(tests)]
-
-
-# noinspection PyUnusedLocal
-def none_log(text):
-    pass
+    return runner.get_test_cases(f_in, parse_test_case)
 
 
-def do(f_in, f_out, log=none_log):
-    test_cases = get_test_cases(f_in)
-    l = len(test_cases)
-    log("=" * 20 + " START " + "=" * 20)
-    start = time.time()
-    for pos, case in enumerate(test_cases):
-        pos += 1
-        log("#" * 10 + "{}/{}".format(pos, l))
-        s = time.time()
-        dump_case_result(case, f_out, pos)
-        log("Elapsed time: " + str(time.time() - s))
-    log("Total Elapsed time: " + str(time.time() - start))
-    log("=" * 20 + "  END  " + "=" * 20)
+def do(f_in, f_out, log=runner.none_log, jobs=1, flush_every=0):
+    runner.do(f_in, f_out, parse_test_case, do_single, log, jobs, flush_every)
 
 
 def dump_case_result(case, f_out, pos):
-    f_out.write("Case #{}: ".format(pos) + str(do_single(case)) + "\n")
-
-
-FILE_TEMPLATE = "{}-{}-practice.{}"
+    runner.dump_case_result(case, f_out, pos, do_single)
 
 
 def file_name(direction, dimension="small", nr=NR):
-    if direction not in ["in", "out"]:
-        raise ValueError()
-    return FILE_TEMPLATE.format(nr, dimension, direction)
-
-
-def usage():
-    print("""{} <input_file> [output_file]
-or
-{} small|large [-]
-    """.format(sys.argv[0]))
-
-
-def default_files(dimension, use_stdout):
-    f_in_name = file_name("in", dimension)
-    f_out_name = file_name("out", dimension)
-    fin = open(f_in_name)
-    if use_stdout:
-        return fin, sys.stdout
-    return fin, open(f_out_name, "w")
+    return runner.file_name(direction, dimension, nr)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        usage()
-        sys.exit(-1)
-
-    if sys.argv[1] in ["small", "large"]:
-        stdout_option = len(sys.argv) > 2 and sys.argv[2] == "-"
-        src, dst = default_files(sys.argv[1], stdout_option)
-    else:
-        src, dst = open(sys.argv[1]), sys.stdout
-        try:
-            dst = open(sys.argv[2], "w")
-        except IndexError:
-            pass
-    do(src, dst, print)
+    runner.main(parse_test_case, do_single, NR)
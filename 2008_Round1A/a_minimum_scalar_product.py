@@ -1,10 +1,28 @@
+import heapq
+import mmap
 import operator
+import os
 import sys
+import tempfile
 import unittest
+from array import array
+from functools import partial
 from io import StringIO
-from itertools import permutations
+from itertools import islice, permutations
 
-import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from codejam import runner
+from codejam.output import FixtureComparator
+from codejam.tokens import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Set nr to  A, B or C
+NR = "A"
 
 
 class VectorPair(object):
@@ -46,7 +64,210 @@ class VectorPair(object):
         return sum(a * b for a, b in zip(v1, v2))
 
 
+INT64_MAX = 2 ** 63 - 1
+
+
+def _fits_int64(n, a_min, a_max, b_min, b_max):
+    """True if no partial sum of ``n`` products of these bounds can overflow int64."""
+    return n * max(-a_min, a_max) * max(-b_min, b_max) <= INT64_MAX
+
+
+def min_scalar_product(v1, v2):
+    """Minimum scalar product of ``v1`` and ``v2`` over all their permutations.
+
+    With numpy the vectors are sorted as int64 arrays and the dot product
+    is computed in int64 when the values bounds guarantee that it can't
+    overflow; otherwise it is computed with python ints.
+    """
+    if len(v1) != len(v2):
+        raise ValueError()
+    if np is None or not len(v1):
+        return VectorPair(v1, v2).best_permutation().scalar()
+    try:
+        a = np.sort(np.asarray(v1, dtype=np.int64))
+        b = np.sort(np.asarray(v2, dtype=np.int64))[::-1]
+    except OverflowError:
+        return VectorPair(v1, v2).best_permutation().scalar()
+    if _fits_int64(len(a), int(a[0]), int(a[-1]), int(b[-1]), int(b[0])):
+        return int(np.dot(a, b))
+    return VectorPair._product(a.tolist(), b.tolist())
+
+
+def min_scalar_products(v1s, v2s):
+    """``min_scalar_product`` of every row pair of two (cases x n) arrays.
+
+    Values that don't fit in int64 are solved row by row with python ints.
+    """
+    if np is None:
+        return [min_scalar_product(list(a), list(b)) for a, b in zip(v1s, v2s)]
+    try:
+        a = np.sort(np.asarray(v1s, dtype=np.int64), axis=1)
+        b = np.sort(np.asarray(v2s, dtype=np.int64), axis=1)[:, ::-1]
+    except OverflowError:
+        return [VectorPair(list(a), list(b)).best_permutation().scalar() for a, b in zip(v1s, v2s)]
+    if a.shape != b.shape or a.ndim != 2:
+        raise ValueError()
+    if not a.shape[1]:
+        return [0] * a.shape[0]
+    results = (a * b).sum(axis=1).tolist()
+    n = a.shape[1]
+    bounds = zip(a[:, 0].tolist(), a[:, -1].tolist(), b[:, -1].tolist(), b[:, 0].tolist())
+    for row, (a_min, a_max, b_min, b_max) in enumerate(bounds):
+        if not _fits_int64(n, a_min, a_max, b_min, b_max):
+            results[row] = VectorPair._product(a[row].tolist(), b[row].tolist())
+    return results
+
+
+MERGE_FAN_IN = 256
+
+
+class DiskVector(object):
+    """A vector of int64 values stored in a temporary file.
+
+    The values are appended in chunks and read back through a memory
+    mapped view, so only the chunk being worked on is kept in memory.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(suffix=".vec", dir=directory)
+        os.close(fd)
+        self._runs = []
+        self.n = 0
+
+    def extend(self, values):
+        values = array("q", values)
+        with open(self.path, "ab") as f:
+            values.tofile(f)
+        self.n += len(values)
+
+    def __len__(self):
+        return self.n
+
+    def sorted(self, chunk_size, reverse=False):
+        """Yield the values in order with an external merge sort.
+
+        Every run of ``chunk_size`` values is sorted in memory and written
+        to its own file. While there are more than ``max(2, chunk_size)``
+        runs (and at most ``MERGE_FAN_IN``) groups of them are merged into
+        new runs; the last ones are merged reading ``chunk_size`` values in
+        total at a time, so both the open files and the memory are bounded.
+        """
+        self._clear_runs()
+        if not self.n:
+            return iter([])
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm).cast("q")
+            try:
+                for start in range(0, self.n, chunk_size):
+                    self._write_run(array("q", sorted(view[start:start + chunk_size], reverse=reverse)))
+            finally:
+                view.release()
+        fan_in = max(2, min(chunk_size, MERGE_FAN_IN))
+        while len(self._runs) > fan_in:
+            group = self._runs[:fan_in]
+            merged = self._merge_runs(group, chunk_size, reverse)
+            with open(self._write_run(array("q")), "ab") as f_run:
+                while True:
+                    values = array("q", islice(merged, chunk_size))
+                    if not values:
+                        break
+                    values.tofile(f_run)
+            for path in group:
+                os.remove(path)
+            self._runs = self._runs[fan_in:]
+        return self._merge_runs(self._runs, chunk_size, reverse)
+
+    def _write_run(self, values):
+        fd, path = tempfile.mkstemp(suffix=".run", dir=os.path.dirname(self.path))
+        self._runs.append(path)
+        with os.fdopen(fd, "wb") as f_run:
+            values.tofile(f_run)
+        return path
+
+    def _merge_runs(self, paths, chunk_size, reverse):
+        buffer_size = max(1, chunk_size // len(paths))
+        return heapq.merge(*[self._read_run(path, buffer_size) for path in paths], reverse=reverse)
+
+    @staticmethod
+    def _read_run(path, buffer_size):
+        with open(path, "rb") as f:
+            while True:
+                values = array("q")
+                try:
+                    values.fromfile(f, buffer_size)
+                except EOFError:
+                    pass
+                if not values:
+                    return
+                yield from values
+
+    def _clear_runs(self):
+        for path in self._runs:
+            os.remove(path)
+        self._runs = []
+
+    def close(self):
+        self._clear_runs()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DiskVectorPair(object):
+    """Out-of-core version of ``VectorPair``: memory is bounded by ``chunk_size`` values."""
+
+    def __init__(self, v1, v2, chunk_size):
+        if v1.n != v2.n:
+            raise ValueError()
+        self.v1 = v1
+        self.v2 = v2
+        self.chunk_size = chunk_size
+
+    def min_scalar_product(self):
+        ascending = self.v1.sorted(self.chunk_size)
+        descending = self.v2.sorted(self.chunk_size, reverse=True)
+        total = 0
+        while True:
+            products = list(islice(map(operator.mul, ascending, descending), self.chunk_size))
+            if not products:
+                return total
+            total += sum(products)
+
+    def close(self):
+        self.v1.close()
+        self.v2.close()
+
+
+def read_disk_vector(tokens, n, chunk_size, directory=None):
+    v = DiskVector(directory)
+    for start in range(0, n, chunk_size):
+        v.extend(tokens.ints(min(chunk_size, n - start)))
+    return v
+
+
+def parse_test_case_on_disk(tokens, chunk_size, directory=None):
+    l = tokens.int()
+    v1 = read_disk_vector(tokens, l, chunk_size, directory)
+    v2 = read_disk_vector(tokens, l, chunk_size, directory)
+    return DiskVectorPair(v1, v2, chunk_size)
+
+
+def do_single_on_disk(case):
+    try:
+        return case.min_scalar_product()
+    finally:
+        case.close()
+
+
 class Test(unittest.TestCase):
+    def _check_fixture(self, do_file, **kw):
+        """Solve the small practice input with ``do_file`` and compare it with the fixture."""
+        f_in_name = file_name("in")
+        f_out_name = file_name("out")
+        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
+            self.skipTest("Both small in and out should be present")
+        with open(f_in_name) as f_in, open(f_out_name) as fixture, FixtureComparator(fixture) as f_out:
+            do_file(f_in, f_out, **kw)
+
     def test_base(self):
         self.assertEqual(0, VectorPair([1, 0, 0], [0, 1, 1]).scalar())
         self.assertEqual(0, VectorPair([1, 0, 0], [0, 0, 1]).scalar())
@@ -93,55 +314,138 @@ class Test(unittest.TestCase):
         for v in permutations(v2):
             self.assertEqual(value, VectorPair(v1, list(v)).best_permutation().scalar())
 
+    def test_min_scalar_product(self):
+        self.assertEqual(-25, min_scalar_product([1, 3, -5], [-2, 4, 1]))
+        self.assertEqual(6, min_scalar_product([1, 2, 3, 4, 5], [1, 0, 1, 0, 1]))
+        self.assertEqual(0, min_scalar_product([], []))
+        with self.assertRaises(ValueError):
+            min_scalar_product([1], [1, 2])
+
+    def test_min_scalar_product_overflow(self):
+        big = [10 ** 9, -10 ** 9] * 1000
+        expected = VectorPair(big, big).best_permutation().scalar()
+        self.assertEqual(expected, min_scalar_product(big, big))
+        huge = [10 ** 20, 3, -10 ** 20]
+        expected = VectorPair(huge, huge).best_permutation().scalar()
+        self.assertEqual(expected, min_scalar_product(huge, huge))
+
+    def test_min_scalar_products(self):
+        v1s = [[1, 3, -5], [1, 2, 3], [10 ** 9, -10 ** 9, 10 ** 9]]
+        v2s = [[-2, 4, 1], [1, 0, 1], [10 ** 9, 10 ** 9, -10 ** 9]]
+        expected = [VectorPair(a, b).best_permutation().scalar() for a, b in zip(v1s, v2s)]
+        self.assertEqual(expected, min_scalar_products(v1s, v2s))
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_min_scalar_products_array(self):
+        rows = np.arange(-60, 60, dtype=np.int64).reshape(4, 30)
+        expected = [min_scalar_product(a.tolist(), b.tolist()) for a, b in zip(rows, rows[::-1])]
+        self.assertEqual(expected, min_scalar_products(rows, rows[::-1]))
+        self.assertEqual([0, 0], min_scalar_products(np.zeros((2, 0)), np.zeros((2, 0))))
+        with self.assertRaises(ValueError):
+            min_scalar_products(rows, rows[:, 1:])
+        self.assertEqual([min_scalar_product([2 ** 70, 1], [3, 4]), 11],
+                         min_scalar_products([[2 ** 70, 1], [1, 2]], [[3, 4], [3, 5]]))
+
+    def test_disk_vector_sorted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            v = DiskVector(tmp)
+            values = [(i * 7919) % 101 - 50 for i in range(103)]
+            v.extend(values[:50])
+            v.extend(values[50:])
+            self.assertEqual(103, v.n)
+            for chunk_size in [1, 4, 103, 1000]:
+                self.assertEqual(sorted(values), list(v.sorted(chunk_size)))
+                self.assertEqual(sorted(values, reverse=True), list(v.sorted(chunk_size, reverse=True)))
+            v.close()
+            self.assertEqual([], os.listdir(tmp))
+
+    def test_disk_vector_fan_in(self):
+        opened = []
+
+        class Counting(DiskVector):
+            def _merge_runs(self, paths, chunk_size, reverse):
+                opened.append(len(paths))
+                return DiskVector._merge_runs(self, paths, chunk_size, reverse)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            values = [(i * 7919) % 1009 - 500 for i in range(600)]
+            v = Counting(tmp)
+            v.extend(values)
+            for chunk_size, fan_in in [(2, 2), (5, 5), (40, 40)]:
+                del opened[:]
+                self.assertEqual(sorted(values), list(v.sorted(chunk_size)))
+                self.assertLessEqual(max(opened), fan_in)
+                self.assertEqual(1, len(os.listdir(tmp)) - len(v._runs))
+            v.close()
+            self.assertEqual([], os.listdir(tmp))
+
+    def test_disk_min_scalar_product(self):
+        v1 = [(i * 7919) % 1001 - 500 for i in range(257)]
+        v2 = [(i * 104729) % 999 - 400 for i in range(257)]
+        text = "257\n{}\n{}\n".format(" ".join(map(str, v1)), " ".join(map(str, v2)))
+        with tempfile.TemporaryDirectory() as tmp:
+            for chunk_size in [1, 10, 1000]:
+                case = parse_test_case_on_disk(tokenize(StringIO(text)), chunk_size, tmp)
+                self.assertEqual(min_scalar_product(v1, v2), do_single_on_disk(case))
+            self.assertEqual([], os.listdir(tmp))
+
     def test_parse_test_case(self):
         sio = StringIO("""3
 1 3 -5
 -2 4 1""")
-        vp = parse_test_case(sio)
+        vp = parse_test_case(tokenize(sio))
         self.assertEqual([1, 3, -5], vp.v1)
         self.assertEqual([-2, 4, 1], vp.v2)
+        vp = parse_test_case(tokenize(StringIO("3\r\n1  3 -5\r\n -2 4\t1\r\n")))
+        self.assertEqual([1, 3, -5], vp.v1)
+        self.assertEqual([-2, 4, 1], vp.v2)
+
+    def test_solution(self):
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                self._check_fixture(do, jobs=jobs)
+
+    def test_solution_on_disk(self):
+        self._check_fixture(runner.do, parse_test_case=partial(parse_test_case_on_disk, chunk_size=3),
+                            do_single=do_single_on_disk)
 
 
-def parse_test_case(f_in):
-    l = len(f_in.readline().strip())
-    v1 = [int(v) for v in f_in.readline().strip().split(" ")]
-    v2 = [int(v) for v in f_in.readline().strip().split(" ")]
-    return VectorPair(v1, v2)
+def parse_test_case(tokens):
+    l = tokens.int()
+    return VectorPair(tokens.ints(l), tokens.ints(l))
 
 
 def do_single(case):
-    return case.best_permutation().scalar()
+    return min_scalar_product(case.v1, case.v2)
 
 
-def do(f_in, f_out):
-    print("=" * 20 + " START " + "=" * 20)
-    start = time.time()
-    tests = int(f_in.readline())
-    test_cases = [parse_test_case(f_in) for _ in range(tests)]
-    l = len(test_cases)
-    for pos, case in enumerate(test_cases):
-        pos += 1
-        print("#"*10 + "{}/{}".format(pos, l))
-        s = time.time()
-        f_out.write("Case #{}: ".format(pos) + str(do_single(case)) + "\n")
-        print("Elapsed time: " + str(time.time()-s))
-    print("Total Elapsed time: " + str(time.time()-start))
-    print("=" * 20 + "  END  " + "=" * 20)
+def case_metrics(case):
+    return {"n": len(case.v1)}
 
 
-def usage():
-    print("""{} <input_file> [output_file]""".format(sys.argv[0]))
+def get_test_cases(f_in):
+    return runner.get_test_cases(f_in, parse_test_case)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        usage()
-        sys.exit(-1)
+def do(f_in, f_out, log=runner.none_log, jobs=1, flush_every=0):
+    runner.do(f_in, f_out, parse_test_case, do_single, log, jobs, flush_every)
 
-    src = open(sys.argv[1])
-    dest = sys.stdout
-    try:
-        dest = open(sys.argv[2], "w")
-    except IndexError:
-        pass
-    do(src, dest)
+
+def dump_case_result(case, f_out, pos):
+    runner.dump_case_result(case, f_out, pos, do_single)
+
+
+def file_name(direction, dimension="small", nr=NR):
+    return runner.file_name(direction, dimension, nr)
+
+
+if __name__ == "__main__":
+    parser = runner.arg_parser()
+    parser.add_argument("--chunk-size", type=int,
+                        help="keep the vectors on disk and at most CHUNK_SIZE values in memory")
+    args = parser.parse_args()
+    if args.chunk_size:
+        runner.run(args, partial(parse_test_case_on_disk, chunk_size=args.chunk_size), do_single_on_disk, NR,
+                   case_metrics)
+    else:
+        runner.run(args, parse_test_case, do_single, NR, case_metrics)
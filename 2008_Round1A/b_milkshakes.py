@@ -1,10 +1,16 @@
+import collections
 import operator
 import os
 import unittest
+import random
 import sys
-import time
+from array import array
 from io import StringIO
-import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from codejam import runner
+from codejam.output import FixtureComparator
+from codejam.tokens import tokenize
 
 
 # Set nr to  A, B or C
@@ -12,23 +18,35 @@ NR = "B"
 
 
 class Solution(object):
+    """Set of flavor codes (see ``Flavor.code``) stored as the bits of an int."""
+    __slots__ = ("_mask", "_cost")
+
     def __init__(self):
-        self._flavors = set()
+        self._mask = 0
         self._cost = 0
 
     def add(self, flavor):
-        if flavor in self._flavors:
+        self.add_code(flavor.code)
+
+    def add_code(self, code):
+        if self._mask >> code & 1:
             return
-        if flavor.opposite() in self._flavors:
+        if self._mask >> (code ^ 1) & 1:
             raise ValueError("Invalid Solution")
-        self._flavors.add(flavor)
-        self._cost += int(flavor.is_malted)
+        self._mask |= 1 << code
+        self._cost += code & 1
 
     def has(self, flavor):
-        return flavor in self._flavors
+        return self.has_code(flavor.code)
+
+    def has_code(self, code):
+        return bool(self._mask >> code & 1)
 
     def compatible(self, flavor):
-        return flavor.opposite() not in self._flavors
+        return not self.has_code(flavor.code ^ 1)
+
+    def satisfies(self, customer):
+        return any(self.has_code(code) for code in customer.codes)
 
     @property
     def cost(self):
@@ -36,7 +54,7 @@ class Solution(object):
 
     def copy(self):
         s = Solution()
-        s._flavors = self._flavors.copy()
+        s._mask = self._mask
         s._cost = self._cost
         return s
 
@@ -51,79 +69,355 @@ class FlavorPlanner(object):
         raise NotImplementedError()
 
 
+def same_popcount_masks(n, k):
+    """Yield the ``n`` bits ints with ``k`` bits set in increasing order (Gosper's hack)."""
+    if k == 0:
+        yield 0
+        return
+    c, limit = (1 << k) - 1, 1 << n
+    while c < limit:
+        yield c
+        u = c & -c
+        v = c + u
+        c = v + (((v ^ c) // u) >> 2)
+
+
 class TrivialFlavorPlanner(FlavorPlanner):
+    """Try every candidate, from the ones with less malted flavors.
+
+    A candidate is an int where the first flavor is the most significant
+    bit: for the same number of malted flavors the candidates come in the
+    lexicographic order of the malted lists.
+    """
+
     def plan(self):
         flavors = self._shop.flavors
-        candidates = itertools.product([False, True], repeat=len(flavors))
-        candidates = sorted(candidates, key=sum)
-        for c in candidates:
-            if all(map(lambda customer: customer.satisfied(c), self._customers)):
-                return [Flavor(f, malted) for f, malted in zip(flavors, c)]
+        n = len(flavors)
+        bits = {}
+        for pos, f in enumerate(flavors):
+            bits[2 * int(f)] = bits[2 * int(f) + 1] = 1 << (n - 1 - pos)
+        masks = []
+        for customer in self._customers:
+            malted, unmalted = 0, 0
+            for code in customer.codes:
+                if code & 1:
+                    malted |= bits.get(code, 0)
+                else:
+                    unmalted |= bits.get(code, 0)
+            masks.append((malted, unmalted))
+        for k in range(n + 1):
+            for c in same_popcount_masks(n, k):
+                if all(c & malted or unmalted & ~c for malted, unmalted in masks):
+                    return [Flavor(f, c >> (n - 1 - pos) & 1) for pos, f in enumerate(flavors)]
         return None
 
 
 class SmartFlavorPlanner(FlavorPlanner):
+    """Depth first search of the cheapest solution, customer by customer.
+
+    Every flavor code has the list of the customers that like it and
+    every customer the number of their codes in the current solution, so
+    adding a code touches only its customers. The codes added by a
+    branch are recorded on a trail and removed when the search
+    backtracks, instead of copying the solution for every branch.
+    """
+
     def __init__(self, shop, *customers):
         super().__init__(shop, *customers)
 
     def plan(self):
-        solution = Solution()
         self._customers = sorted(self._customers, key=operator.attrgetter("n_flavors"))
-        for f in self._unmalted_no_conflict_flavors():
-            solution.add(f)
-        first = 0
-        for pos, customer in enumerate(self._customers):
-            if customer.n_flavors > 1:
-                first = pos
-                break
-            try:
-                solution.add(customer.flavors[0])
-            except ValueError:
-                return None
+        self._init_search()
         try:
-            solution = self._sub_planning(solution, first)
-            return self._to_list(solution)
+            for f in self._unmalted_no_conflict_flavors():
+                self._add(f.code)
+            first = len(self._customers)
+            for pos, customer in enumerate(self._customers):
+                if customer.n_flavors > 1:
+                    first = pos
+                    break
+                self._add(customer.codes[0])
         except ValueError:
             return None
+        chosen = self._search(first)
+        if chosen is None:
+            return None
+        return self._to_list(chosen)
+
+    def _init_search(self):
+        size = 2 * max([int(f) for f in self._shop.flavors] +
+                       [code >> 1 for c in self._customers for code in c.codes] + [0]) + 2
+        self._index = [[] for _ in range(size)]
+        for pos, customer in enumerate(self._customers):
+            for code in customer.codes:
+                self._index[code].append(pos)
+        self._satisfied = [0] * len(self._customers)
+        self._chosen = bytearray(size)
+        self._trail = []
+        self._cost = 0
 
-    def _sub_planning(self, solution, pos):
-        pos = self._skip_first_satisfied_customers(solution, pos)
-        if not self._customers[pos:]:
-            return solution
-        customer = self._customers[pos]
-        solutions = []
-        for flavor in customer.flavors:
-            if not solution.compatible(flavor):
+    def _add(self, code):
+        if self._chosen[code]:
+            return
+        if self._chosen[code ^ 1]:
+            raise ValueError("Invalid Solution")
+        self._chosen[code] = 1
+        self._trail.append(code)
+        self._cost += code & 1
+        for pos in self._index[code]:
+            self._satisfied[pos] += 1
+
+    def _undo(self, mark):
+        """Remove the codes added after the trail was ``mark`` long."""
+        while len(self._trail) > mark:
+            code = self._trail.pop()
+            self._chosen[code] = 0
+            self._cost -= code & 1
+            for pos in self._index[code]:
+                self._satisfied[pos] -= 1
+
+    def _first_unsatisfied(self, start):
+        satisfied = self._satisfied
+        while start < len(satisfied) and satisfied[start]:
+            start += 1
+        return start
+
+    def _search(self, start):
+        """The cheapest (first in search order) completion, as the chosen codes flags.
+
+        Every frame is ``[customer position, next branch, trail mark]``; a
+        branch can't beat the best solution once it costs as much.
+        """
+        best, best_cost = None, None
+        frames = [[self._first_unsatisfied(start), 0, len(self._trail)]]
+        while frames:
+            frame = frames[-1]
+            pos, branch, mark = frame
+            self._undo(mark)
+            if pos == len(self._customers):
+                if best_cost is None or self._cost < best_cost:
+                    best, best_cost = bytes(self._chosen), self._cost
+                frames.pop()
                 continue
-            new_solution = solution.copy()
-            new_solution.add(flavor)
-            try:
-                solutions.append(self._sub_planning(new_solution, pos + 1))
-            except ValueError:
-                pass
-        if not solutions:
-            raise ValueError("Invalid solution")
-        return min(solutions, key=operator.attrgetter("cost"))
-
-    def _skip_first_satisfied_customers(self, solution, start):
-        for pos, customer in enumerate(self._customers[start:]):
-            if not customer.valid_solution(solution):
-                return start + pos
-        return len(self._customers)
+            codes = self._customers[pos].codes
+            if branch == len(codes) or (best_cost is not None and self._cost >= best_cost):
+                frames.pop()
+                continue
+            frame[1] += 1
+            code = codes[branch]
+            if self._chosen[code ^ 1]:
+                continue
+            self._add(code)
+            frames.append([self._first_unsatisfied(pos + 1), 0, len(self._trail)])
+        self._undo(0)
+        return best
 
     def _unmalted_no_conflict_flavors(self):
-        unmalted = set()
-        malted = set()
+        codes = set()
         for c in self._customers:
-            unmalted.update(map(lambda code: Flavor(code, False), c.unmalted))
-            malted.update(map(lambda code: Flavor(code, True), c.malted))
-        return {f for f in unmalted if f.opposite() not in malted}
+            codes.update(c.codes)
+        return [Flavor.from_code(code) for code in codes if not code & 1 and code | 1 not in codes]
 
-    def _to_list(self, solution):
-        result = []
-        for f in [Flavor(f, False) for f in self._shop.flavors]:
-            result.append(f if not solution.has(f.opposite()) else f.opposite())
-        return result
+    def _to_list(self, chosen):
+        codes = [2 * int(f) for f in self._shop.flavors]
+        return [Flavor.from_code(code | chosen[code | 1]) for code in codes]
+
+
+class PropagationFlavorPlanner(FlavorPlanner):
+    """Start with every flavor unmalted and malt a flavor only when forced.
+
+    Every customer likes at most one malted flavor: when all the unmalted
+    flavors of a customer are malted the only way to satisfy the customer
+    is malting their malted one. The forced choices are propagated by a
+    worklist and every flavor keeps the list of the customers that like it
+    unmalted, so the planning is linear in the total number of choices.
+    """
+
+    def plan(self):
+        flavors = [int(f) for f in self._shop.flavors]
+        malted = [False] * (max(flavors, default=0) + 1)
+        watchers = [[] for _ in malted]
+        unmalted_left = []
+        wanted = []
+        worklist = []
+        for pos, customer in enumerate(self._customers):
+            malted_flavor = None
+            left = 0
+            for code in customer.codes:
+                if not code & 1:
+                    left += 1
+                    watchers[code >> 1].append(pos)
+                elif malted_flavor in (None, code >> 1):
+                    malted_flavor = code >> 1
+                else:
+                    raise ValueError("Customer {} likes more than one malted flavor".format(customer))
+            wanted.append(malted_flavor)
+            unmalted_left.append(left)
+            if not left:
+                worklist.append(pos)
+        while worklist:
+            flavor = wanted[worklist.pop()]
+            if flavor is None:
+                return None
+            if malted[flavor]:
+                continue
+            malted[flavor] = True
+            for pos in watchers[flavor]:
+                unmalted_left[pos] -= 1
+                if not unmalted_left[pos]:
+                    worklist.append(pos)
+        return [Flavor.from_code(2 * f + malted[f]) for f in flavors]
+
+
+class IncrementalFlavorPlanner(FlavorPlanner):
+    """``PropagationFlavorPlanner`` that keeps its state while customers come and go.
+
+    Every malted flavor remembers the customer that forced it. Adding a
+    customer propagates only what the customer forces; removing one
+    unmalts the flavors that depended on that customer through these
+    reasons and derives them again from the other customers, so an update
+    costs as much as the customers it touches. ``plan()`` is always the
+    one of a full planning.
+    """
+
+    def __init__(self, shop, *customers):
+        super().__init__(shop)
+        self._orders = {}
+        self._next_key = 0
+        self._watchers = collections.defaultdict(set)
+        self._wanters = collections.defaultdict(set)
+        self._unmalted_left = {}
+        self._reasons = {}
+        self._unhappy = set()
+        for customer in customers:
+            self.add_customer(customer)
+
+    def add_customer(self, customer):
+        """Add ``customer`` and return the key to remove the customer."""
+        unmalted = tuple(sorted({code >> 1 for code in customer.codes if not code & 1}))
+        wanted = {code >> 1 for code in customer.codes if code & 1}
+        if len(wanted) > 1:
+            raise ValueError("Customer {} likes more than one malted flavor".format(customer))
+        wanted = wanted.pop() if wanted else None
+        key = self._next_key
+        self._next_key += 1
+        self._orders[key] = (unmalted, wanted)
+        for flavor in unmalted:
+            self._watchers[flavor].add(key)
+        if wanted is not None:
+            self._wanters[wanted].add(key)
+        self._unmalted_left[key] = sum(flavor not in self._reasons for flavor in unmalted)
+        if not self._unmalted_left[key]:
+            self._propagate([key])
+        return key
+
+    def remove_customer(self, key):
+        unmalted, wanted = self._orders.pop(key)
+        for flavor in unmalted:
+            self._watchers[flavor].discard(key)
+        if wanted is not None:
+            self._wanters[wanted].discard(key)
+        del self._unmalted_left[key]
+        self._unhappy.discard(key)
+        if wanted is not None and self._reasons.get(wanted) == key:
+            self._propagate(self._retract(wanted))
+
+    def _propagate(self, worklist):
+        while worklist:
+            key = worklist.pop()
+            flavor = self._orders[key][1]
+            if flavor is None:
+                self._unhappy.add(key)
+                continue
+            if flavor in self._reasons:
+                continue
+            self._reasons[flavor] = key
+            for watcher in self._watchers[flavor]:
+                self._unmalted_left[watcher] -= 1
+                if not self._unmalted_left[watcher]:
+                    worklist.append(watcher)
+
+    def _retract(self, flavor):
+        """Unmalt ``flavor`` and what it forced: return the customers that can force them again."""
+        retracted = []
+        stack = [flavor]
+        while stack:
+            flavor = stack.pop()
+            del self._reasons[flavor]
+            retracted.append(flavor)
+            for watcher in self._watchers[flavor]:
+                self._unmalted_left[watcher] += 1
+                if self._unmalted_left[watcher] == 1:
+                    self._unhappy.discard(watcher)
+                    forced = self._orders[watcher][1]
+                    if forced is not None and self._reasons.get(forced) == watcher:
+                        stack.append(forced)
+        return [key for flavor in retracted for key in self._wanters[flavor] if not self._unmalted_left[key]]
+
+    @property
+    def malted(self):
+        """The malted flavors, ``None`` if some customer can't be satisfied."""
+        return None if self._unhappy else set(self._reasons)
+
+    def plan(self):
+        if self._unhappy:
+            return None
+        return [Flavor.from_code(2 * int(f) + (int(f) in self._reasons)) for f in self._shop.flavors]
+
+
+class OrdersPropagationPlanner(object):
+    """``PropagationFlavorPlanner`` working directly on the flat arrays of an ``Orders``.
+
+    The customers that like a flavor unmalted are kept in a CSR index
+    too, so the planning doesn't create any object per choice.
+    """
+
+    def __init__(self, orders):
+        self._orders = orders
+
+    def plan(self):
+        """The malted bit of every flavor (a ``bytearray``), ``None`` if impossible."""
+        orders = self._orders
+        n, customers = orders.n_flavors, len(orders)
+        offsets, flavors, malted = orders.offsets, orders.flavors, orders.malted
+        starts = array("i", [0]) * (n + 2)
+        for f, m in zip(flavors, malted):
+            if not m:
+                starts[f + 1] += 1
+        for f in range(1, n + 2):
+            starts[f] += starts[f - 1]
+        watchers = array("i", [0]) * starts[n + 1]
+        fill = array("i", starts)
+        wanted = array("i", [0]) * customers
+        unmalted_left = array("i", [0]) * customers
+        worklist = []
+        for pos in range(customers):
+            for i in range(offsets[pos], offsets[pos + 1]):
+                f = flavors[i]
+                if not malted[i]:
+                    unmalted_left[pos] += 1
+                    watchers[fill[f]] = pos
+                    fill[f] += 1
+                elif wanted[pos] in (0, f):
+                    wanted[pos] = f
+                else:
+                    raise ValueError("Customer {} likes more than one malted flavor".format(orders.customer(pos)))
+            if not unmalted_left[pos]:
+                worklist.append(pos)
+        result = bytearray(n + 1)
+        while worklist:
+            flavor = wanted[worklist.pop()]
+            if not flavor:
+                return None
+            if result[flavor]:
+                continue
+            result[flavor] = 1
+            for i in range(starts[flavor], starts[flavor + 1]):
+                pos = watchers[i]
+                unmalted_left[pos] -= 1
+                if not unmalted_left[pos]:
+                    worklist.append(pos)
+        return result[1:]
 
 
 class MilkshakeShop(object):
@@ -150,29 +444,41 @@ class MilkshakeShop(object):
 
 
 class Flavor(object):
+    """A flavor choice packed in a single int ``code``: ``2 * flavor + malted``."""
+    __slots__ = ("_code",)
+
     def __init__(self, name, malted):
-        self._name = str(name)
-        self._malted = malted
+        self._code = 2 * int(name) + int(bool(malted))
+
+    @classmethod
+    def from_code(cls, code):
+        f = cls.__new__(cls)
+        f._code = code
+        return f
+
+    @property
+    def code(self):
+        return self._code
 
     @property
     def name(self):
-        return self._name
+        return str(self._code >> 1)
 
     @property
     def is_malted(self):
-        return self._malted
+        return bool(self._code & 1)
 
     def opposite(self):
-        return Flavor(self.name, not self.is_malted)
+        return Flavor.from_code(self._code ^ 1)
 
     def __str__(self):
-        return self._name + ("m" if self.is_malted else "")
+        return self.name + ("m" if self.is_malted else "")
 
     def __eq__(self, other):
-        return self.name == other.name and self.is_malted == other.is_malted
+        return self._code == other.code
 
     def __hash__(self):
-        return (1 + int(self.is_malted)) * hash(self._name)
+        return self._code
 
     @classmethod
     def list_code(cls, flavors):
@@ -180,46 +486,123 @@ class Flavor(object):
 
 
 class Customer(object):
+    """The flavor codes that a customer likes.
+
+    The bitmask of the codes is built only when asked: stored, it would
+    take ``2 * flavors`` bits for every customer.
+    """
+    __slots__ = ("_codes",)
+
     def __init__(self, *flavors):
-        if not len(flavors):
+        self._init_codes(tuple(f.code for f in flavors))
+
+    @classmethod
+    def from_codes(cls, codes):
+        c = cls.__new__(cls)
+        c._init_codes(tuple(codes))
+        return c
+
+    def _init_codes(self, codes):
+        if not len(codes):
             raise ValueError()
-        self._flavors = list(flavors)
-        self._malted_flavors_code = {f.name for f in self._flavors if f.is_malted}
-        self._unmalted_flavors_code = {f.name for f in self._flavors if not f.is_malted}
+        self._codes = codes
 
     def satisfied(self, malted_list):
-        for pos, is_malted in enumerate(malted_list):
-            code = str(pos + 1)
-            l = self._malted_flavors_code if is_malted else self._unmalted_flavors_code
-            if code in l:
+        l = len(malted_list)
+        for code in self._codes:
+            pos = (code >> 1) - 1
+            if 0 <= pos < l and bool(malted_list[pos]) == bool(code & 1):
                 return True
         return False
 
     def valid_solution(self, solution):
-        return any((solution.has(f) for f in self._flavors))
+        return solution.satisfies(self)
 
     @property
     def n_flavors(self):
-        return len(self._flavors)
+        return len(self._codes)
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def mask(self):
+        mask = 0
+        for code in self._codes:
+            mask |= 1 << code
+        return mask
 
     @property
     def flavors(self):
-        return self._flavors[:]
+        return [Flavor.from_code(code) for code in self._codes]
 
     @property
     def malted(self):
-        return self._malted_flavors_code.copy()
+        return {str(code >> 1) for code in self._codes if code & 1}
 
     @property
     def unmalted(self):
-        return self._unmalted_flavors_code.copy()
+        return {str(code >> 1) for code in self._codes if not code & 1}
 
     def __str__(self):
-        return Flavor.list_code(self._flavors)
+        return Flavor.list_code(self.flavors)
+
+
+class Orders(object):
+    """All the customers of a shop in CSR layout.
+
+    The choices of customer ``i`` are at positions ``offsets[i]`` to
+    ``offsets[i + 1]`` of the flat ``flavors`` and ``malted`` arrays;
+    ``MilkshakeShop`` and ``Customer`` objects are built only on demand.
+    """
+    __slots__ = ("n_flavors", "offsets", "flavors", "malted")
+
+    def __init__(self, n_flavors, offsets=None, flavors=None, malted=None):
+        self.n_flavors = n_flavors
+        self.offsets = array("i", [0]) if offsets is None else offsets
+        self.flavors = array("i") if flavors is None else flavors
+        self.malted = array("b") if malted is None else malted
+
+    @classmethod
+    def from_customers(cls, shop, customers):
+        orders = cls(len(shop.flavors))
+        for customer in customers:
+            orders.add([code >> 1 for code in customer.codes], [code & 1 for code in customer.codes])
+        return orders
+
+    def add(self, flavors, malted):
+        self.flavors.extend(flavors)
+        self.malted.extend(malted)
+        self.offsets.append(len(self.flavors))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def codes(self, pos):
+        return [2 * self.flavors[i] + self.malted[i] for i in range(self.offsets[pos], self.offsets[pos + 1])]
+
+    def customer(self, pos):
+        return Customer.from_codes(self.codes(pos))
+
+    def customers(self):
+        return [self.customer(pos) for pos in range(len(self))]
+
+    def shop(self):
+        return MilkshakeShop(self.n_flavors)
 
 
 # noinspection PyPep8Naming
 class Test(unittest.TestCase):
+    def _check_fixture(self, do_file, **kw):
+        """Solve the small practice input with ``do_file`` and compare it with the fixture."""
+        f_in_name = file_name("in")
+        f_out_name = file_name("out")
+        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
+            self.skipTest("Both small in and out should be present")
+        with open(f_in_name) as f_in, open(f_out_name) as fixture, FixtureComparator(fixture) as f_out:
+            do_file(f_in, f_out, **kw)
+
     def test_base(self):
         shop = MilkshakeShop(4)
         self.assertEqual(["1", "2", "3", "4"], shop.flavors)
@@ -258,6 +641,212 @@ class Test(unittest.TestCase):
         result = SmartFlavorPlanner(shop, c0, c1, c2).plan()
         self.assertEqual("1m|2|3|4|5", Flavor.list_code(result))
 
+    def test_same_popcount_masks(self):
+        self.assertEqual([0], list(same_popcount_masks(3, 0)))
+        self.assertEqual([0b011, 0b101, 0b110], list(same_popcount_masks(3, 2)))
+        self.assertEqual([0b111], list(same_popcount_masks(3, 3)))
+        self.assertEqual(252, len(list(same_popcount_masks(10, 5))))
+
+    def test_trivial_planning(self):
+        shop = MilkshakeShop(5)
+        c0 = Customer(Flavor(1, True))
+        c1 = Customer(Flavor(1, False), Flavor(2, False))
+        c2 = Customer(Flavor(5, False))
+        result = TrivialFlavorPlanner(shop, c0, c1, c2).plan()
+        self.assertEqual("1m|2|3|4|5", Flavor.list_code(result))
+        shop = MilkshakeShop(1)
+        self.assertIsNone(TrivialFlavorPlanner(shop, Customer(Flavor(1, False)), Customer(Flavor(1, True))).plan())
+
+    def test_trivial_lexicographic_order(self):
+        shop = MilkshakeShop(3)
+        result = TrivialFlavorPlanner(shop, Customer(Flavor(1, True), Flavor(2, True))).plan()
+        self.assertEqual("1|2m|3", Flavor.list_code(result))
+
+    def test_trivial_many_flavors(self):
+        shop = MilkshakeShop(60)
+        c0 = Customer(Flavor(59, True))
+        c1 = Customer(Flavor(59, False), Flavor(3, True))
+        result = TrivialFlavorPlanner(shop, c0, c1).plan()
+        self.assertEqual({"3m", "59m"}, {str(f) for f in result if f.is_malted})
+
+    def test_engines_agree(self):
+        def planner(planner_class):
+            return lambda shop, customers: planner_class(shop, *customers).plan()
+
+        def orders(shop, customers):
+            return do_single_orders(Orders.from_customers(shop, customers))
+
+        # (engine, its reference, the largest shop it can plan)
+        pairs = [
+            ("trivial", planner(TrivialFlavorPlanner), planner(PropagationFlavorPlanner), 10),
+            ("propagation", planner(PropagationFlavorPlanner), planner(SmartFlavorPlanner), None),
+            ("orders", orders, lambda shop, customers: do_single((shop, customers)), None),
+        ]
+        f_in_name = file_name("in")
+        if not os.path.isfile(f_in_name):
+            self.skipTest("Small in should be present")
+        for name, engine, reference, max_flavors in pairs:
+            with self.subTest(name), open(f_in_name) as f_in:
+                for shop, customers in get_test_cases(f_in):
+                    if max_flavors is None or len(shop.flavors) <= max_flavors:
+                        self.assertEqual(reference(shop, customers), engine(shop, customers))
+
+    def test_propagation_planning(self):
+        shop = MilkshakeShop(5)
+        c0 = Customer(Flavor(1, True))
+        c1 = Customer(Flavor(1, False), Flavor(2, False))
+        c2 = Customer(Flavor(5, False))
+        result = PropagationFlavorPlanner(shop, c0, c1, c2).plan()
+        self.assertEqual("1m|2|3|4|5", Flavor.list_code(result))
+
+    def test_propagation_chain(self):
+        shop = MilkshakeShop(4)
+        c0 = Customer(Flavor(1, True))
+        c1 = Customer(Flavor(1, False), Flavor(2, True))
+        c2 = Customer(Flavor(2, False), Flavor(3, False), Flavor(4, True))
+        c3 = Customer(Flavor(3, True), Flavor(4, False))
+        c4 = Customer(Flavor(3, False), Flavor(3, True))
+        result = PropagationFlavorPlanner(shop, c0, c1, c2, c3, c4).plan()
+        self.assertEqual("1m|2m|3|4", Flavor.list_code(result))
+        c5 = Customer(Flavor(3, False), Flavor(4, False))
+        c6 = Customer(Flavor(4, True))
+        self.assertIsNone(PropagationFlavorPlanner(shop, c0, c1, c2, c3, c5, c6).plan())
+
+    def test_propagation_impossible(self):
+        shop = MilkshakeShop(1)
+        c0 = Customer(Flavor(1, False))
+        c1 = Customer(Flavor(1, True))
+        self.assertIsNone(PropagationFlavorPlanner(shop, c0, c1).plan())
+
+    def test_propagation_more_malted(self):
+        shop = MilkshakeShop(2)
+        with self.assertRaises(ValueError):
+            PropagationFlavorPlanner(shop, Customer(Flavor(1, True), Flavor(2, True))).plan()
+
+    def test_smart_backtracking(self):
+        shop = MilkshakeShop(3)
+        c0 = Customer(Flavor(1, True), Flavor(2, False))
+        c1 = Customer(Flavor(2, True), Flavor(3, False))
+        c2 = Customer(Flavor(3, True), Flavor(1, False))
+        planner = SmartFlavorPlanner(shop, c0, c1, c2)
+        self.assertEqual("1|2|3", Flavor.list_code(planner.plan()))
+        self.assertEqual(([], [0, 0, 0]), (planner._trail, planner._satisfied))
+        c3 = Customer(Flavor(1, True))
+        c4 = Customer(Flavor(3, True), Flavor(2, False))
+        self.assertEqual("1m|2m|3m", Flavor.list_code(SmartFlavorPlanner(shop, c0, c1, c2, c3, c4).plan()))
+
+    def test_incremental_planning(self):
+        shop = MilkshakeShop(4)
+        c0 = Customer(Flavor(1, True))
+        c1 = Customer(Flavor(1, False), Flavor(2, True))
+        c2 = Customer(Flavor(2, False), Flavor(3, False), Flavor(4, True))
+        c3 = Customer(Flavor(3, True), Flavor(4, False))
+        planner = IncrementalFlavorPlanner(shop, c1, c2, c3)
+        self.assertEqual(set(), planner.malted)
+        k0 = planner.add_customer(c0)
+        self.assertEqual("1m|2m|3|4", Flavor.list_code(planner.plan()))
+        k5 = planner.add_customer(Customer(Flavor(3, False), Flavor(4, False)))
+        k6 = planner.add_customer(Customer(Flavor(4, True)))
+        self.assertIsNone(planner.plan())
+        planner.remove_customer(k5)
+        self.assertEqual({1, 2, 3, 4}, planner.malted)
+        planner.remove_customer(k0)
+        self.assertEqual({3, 4}, planner.malted)
+        planner.remove_customer(k6)
+        self.assertEqual(set(), planner.malted)
+
+    def test_incremental_cycle(self):
+        shop = MilkshakeShop(3)
+        planner = IncrementalFlavorPlanner(shop)
+        k0 = planner.add_customer(Customer(Flavor(1, True)))
+        planner.add_customer(Customer(Flavor(1, False), Flavor(2, True)))
+        planner.add_customer(Customer(Flavor(2, False), Flavor(1, True)))
+        planner.add_customer(Customer(Flavor(2, False), Flavor(3, True)))
+        self.assertEqual({1, 2, 3}, planner.malted)
+        planner.remove_customer(k0)
+        self.assertEqual(set(), planner.malted)
+        with self.assertRaises(ValueError):
+            planner.add_customer(Customer(Flavor(1, True), Flavor(2, True)))
+
+    def test_incremental_as_propagation(self):
+        rnd = random.Random(1)
+        for _ in range(20):
+            n = rnd.randint(1, 8)
+            shop = MilkshakeShop(n)
+            planner = IncrementalFlavorPlanner(shop)
+            customers = {}
+            for _ in range(60):
+                if customers and rnd.random() < 0.4:
+                    key = rnd.choice(list(customers))
+                    planner.remove_customer(key)
+                    del customers[key]
+                else:
+                    flavors = rnd.sample(range(1, n + 1), rnd.randint(1, min(3, n)))
+                    malted = rnd.randrange(len(flavors) + 1)
+                    customer = Customer(*[Flavor(f, pos == malted) for pos, f in enumerate(flavors)])
+                    customers[planner.add_customer(customer)] = customer
+                expected = PropagationFlavorPlanner(shop, *customers.values()).plan()
+                self.assertEqual(expected, planner.plan())
+
+    def test_orders(self):
+        orders = parse_orders(tokenize(StringIO("5\n3\n1 1 1\n2 1 0 2 0\n1 5 0\n")))
+        self.assertEqual(3, len(orders))
+        self.assertEqual([0, 1, 3, 4], list(orders.offsets))
+        self.assertEqual([1, 1, 2, 5], list(orders.flavors))
+        self.assertEqual([1, 0, 0, 0], list(orders.malted))
+        self.assertEqual("1m-1|2-5", "-".join(map(str, orders.customers())))
+        shop, customers = parse_test_case(tokenize(StringIO("5\n3\n1 1 1\n2 1 0 2 0\n1 5 0\n")))
+        same = Orders.from_customers(shop, customers)
+        self.assertEqual((orders.offsets, orders.flavors, orders.malted), (same.offsets, same.flavors, same.malted))
+
+    def test_orders_planning(self):
+        orders = Orders(4)
+        for flavors, malted in [([1], [1]), ([1, 2], [0, 1]), ([2, 3, 4], [0, 0, 1]), ([3, 4], [1, 0])]:
+            orders.add(flavors, malted)
+        self.assertEqual(bytearray([1, 1, 0, 0]), OrdersPropagationPlanner(orders).plan())
+        orders.add([4], [1])
+        orders.add([3, 4], [0, 0])
+        self.assertIsNone(OrdersPropagationPlanner(orders).plan())
+        with self.assertRaises(ValueError):
+            OrdersPropagationPlanner(Orders(2, array("i", [0, 2]), array("i", [1, 2]), array("b", [1, 1]))).plan()
+
+    def test_solution_orders(self):
+        self._check_fixture(runner.do, parse_test_case=parse_orders, do_single=do_single_orders)
+
+    def test_flavor_code(self):
+        f = Flavor(7, True)
+        self.assertEqual(15, f.code)
+        self.assertEqual("7", f.name)
+        self.assertTrue(f.is_malted)
+        self.assertEqual(Flavor("7", False), f.opposite())
+        self.assertEqual(f, Flavor.from_code(15))
+        self.assertEqual(hash(f), hash(Flavor(7, 1)))
+
+    def test_customer_codes(self):
+        customer = Customer(Flavor(1, False), Flavor(2, True), Flavor(5, False))
+        self.assertEqual((2, 5, 10), customer.codes)
+        self.assertEqual(1 << 2 | 1 << 5 | 1 << 10, customer.mask)
+        self.assertEqual({"2"}, customer.malted)
+        self.assertEqual({"1", "5"}, customer.unmalted)
+        self.assertTrue(customer.satisfied([True, True]))
+        self.assertFalse(customer.satisfied([True, False, True, True]))
+        self.assertTrue(customer.satisfied([True, False, True, True, False]))
+        s = Solution()
+        s.add(Flavor(1, True))
+        self.assertFalse(customer.valid_solution(s))
+        s.add(Flavor(5, False))
+        self.assertTrue(customer.valid_solution(s))
+
+    def test_solution_copy(self):
+        s = Solution()
+        s.add(Flavor(1, True))
+        c = s.copy()
+        c.add(Flavor(2, True))
+        self.assertFalse(s.has(Flavor(2, True)))
+        self.assertTrue(c.has(Flavor(1, True)))
+        self.assertFalse(c.compatible(Flavor(1, False)))
+        self.assertEqual((1, 2), (s.cost, c.cost))
+
     def test_invalid_solution(self):
         s = Solution()
         s.add(Flavor(1, True))
@@ -293,7 +882,7 @@ class Test(unittest.TestCase):
 1 5 0
         """
         si = StringIO(INPUT.strip())
-        shop, customers = parse_test_case(si)
+        shop, customers = parse_test_case(tokenize(si))
         self.assertEqual(5, len(shop.flavors))
         self.assertEqual(3, len(customers))
         self.assertEqual("1m-1|2-5", "-".join(map(str, customers)))
@@ -322,107 +911,91 @@ Case #2: IMPOSSIBLE
         self.assertEqual(so.getvalue().strip(), OUTPUT.strip())
 
     def test_solution(self):
-        f_in_name = file_name("in")
-        f_out_name = file_name("out")
-        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
-            self.skipTest("Both small in and out should be present")
-        f_in = open(f_in_name)
-        f_out = StringIO()
-        do(f_in, f_out)
-        with open(f_out_name) as fixture:
-            self.assertEqual(f_out.getvalue(), fixture.read())
-
-
-def parse_customer(line):
-    elements = line.split(" ")
-    choices = int(elements[0])
-    flavors = []
-    for i in range(0, 2 * choices, 2):
-        flavors.append(Flavor(int(elements[i + 1]), int(elements[i + 2])))
-    return Customer(*flavors)
-
-
-def parse_test_case(f_in):
-    shop = MilkshakeShop(int(f_in.readline().strip()))
-    n_customers = int(f_in.readline().strip())
-    customers = [parse_customer(f_in.readline()) for _ in range(n_customers)]
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                self._check_fixture(do, jobs=jobs)
+
+    def test_solution_smart(self):
+        self._check_fixture(runner.do, parse_test_case=parse_test_case, do_single=do_single_smart)
+
+
+def parse_customer(tokens):
+    choices = tokens.int()
+    elements = tokens.ints(2 * choices)
+    return Customer.from_codes(2 * elements[i] + elements[i + 1] for i in range(0, 2 * choices, 2))
+
+
+def parse_orders(tokens):
+    """Parse a case straight into an ``Orders``: no object per customer or choice."""
+    orders = Orders(tokens.int())
+    for _ in range(tokens.int()):
+        elements = tokens.ints(2 * tokens.int())
+        orders.add(elements[0::2], elements[1::2])
+    return orders
+
+
+def parse_test_case(tokens):
+    shop = MilkshakeShop(tokens.int())
+    n_customers = tokens.int()
+    customers = [parse_customer(tokens) for _ in range(n_customers)]
     return shop, customers
 
 
 def do_single(case):
     shop, customers = case
-    planning = SmartFlavorPlanner(shop, *customers).plan()
+    planning = PropagationFlavorPlanner(shop, *customers).plan()
     if planning is None:
         return "IMPOSSIBLE"
     return " ".join([str(int(f.is_malted)) for f in planning])
 
 
-def get_test_cases(f_in):
-    tests = int(f_in.readline())
-    return [parse_test_case(f_in) for _ in range(tests)]
+def do_single_smart(case):
+    """``do_single`` with the depth first search of ``SmartFlavorPlanner``."""
+    shop, customers = case
+    planning = SmartFlavorPlanner(shop, *customers).plan()
+    if planning is None:
+        return "IMPOSSIBLE"
+    return " ".join([str(int(f.is_malted)) for f in planning])
 
 
-# noinspection PyUnusedLocal
-def none_log(text):
-    pass
+def case_metrics(case):
+    shop, customers = case
+    return {"flavors": len(shop.flavors), "customers": len(customers)}
 
 
-def do(f_in, f_out, log=none_log):
-    test_cases = get_test_cases(f_in)
-    l = len(test_cases)
-    log("=" * 20 + " START " + "=" * 20)
-    start = time.time()
-    for pos, case in enumerate(test_cases):
-        pos += 1
-        log("#" * 10 + "{}/{}".format(pos, l))
-        s = time.time()
-        dump_case_result(case, f_out, pos)
-        log("Elapsed time: " + str(time.time() - s))
-    log("Total Elapsed time: " + str(time.time() - start))
-    log("=" * 20 + "  END  " + "=" * 20)
+def do_single_orders(orders):
+    planning = OrdersPropagationPlanner(orders).plan()
+    if planning is None:
+        return "IMPOSSIBLE"
+    return " ".join(map(str, planning))
 
 
-def dump_case_result(case, f_out, pos):
-    f_out.write("Case #{}: ".format(pos) + str(do_single(case)) + "\n")
+def orders_metrics(orders):
+    return {"flavors": orders.n_flavors, "customers": len(orders)}
 
 
-FILE_TEMPLATE = "{}-{}-practice.{}"
+def get_test_cases(f_in):
+    return runner.get_test_cases(f_in, parse_test_case)
 
 
-def file_name(direction, dimension="small", nr=NR):
-    if direction not in ["in", "out"]:
-        raise ValueError()
-    return FILE_TEMPLATE.format(nr, dimension, direction)
+def do(f_in, f_out, log=runner.none_log, jobs=1, flush_every=0):
+    runner.do(f_in, f_out, parse_test_case, do_single, log, jobs, flush_every)
 
 
-def usage():
-    print("""{} <input_file> [output_file]
-or
-{} small|large [-]
-    """.format(sys.argv[0]))
+def dump_case_result(case, f_out, pos):
+    runner.dump_case_result(case, f_out, pos, do_single)
 
 
-def default_files(dimension, use_stdout):
-    f_in_name = file_name("in", dimension)
-    f_out_name = file_name("out", dimension)
-    fin = open(f_in_name)
-    if use_stdout:
-        return fin, sys.stdout
-    return fin, open(f_out_name, "w")
+def file_name(direction, dimension="small", nr=NR):
+    return runner.file_name(direction, dimension, nr)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        usage()
-        sys.exit(-1)
-
-    if sys.argv[1] in ["small", "large"]:
-        stdout_option = len(sys.argv) > 2 and sys.argv[2] == "-"
-        src, dst = default_files(sys.argv[1], stdout_option)
+    parser = runner.arg_parser()
+    parser.add_argument("--flat", action="store_true",
+                        help="keep every case in flat arrays instead of Customer objects")
+    args = parser.parse_args()
+    if args.flat:
+        runner.run(args, parse_orders, do_single_orders, NR, orders_metrics)
     else:
-        src, dst = open(sys.argv[1]), sys.stdout
-        try:
-            dst = open(sys.argv[2], "w")
-        except IndexError:
-            pass
-    do(src, dst, print)
+        runner.run(args, parse_test_case, do_single, NR, case_metrics)
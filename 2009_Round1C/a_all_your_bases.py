@@ -1,5 +1,19 @@
+import decimal
+import functools
+import os
 import unittest
 import sys
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from codejam import runner
+from codejam.output import FixtureComparator
+from codejam.tokens import tokenize
+
+
+# Set nr to  A, B or C
+NR = "A"
+
 
 def get_base(code):
     return max(2, len(set(code)))
@@ -14,19 +28,150 @@ def sub_solve(base, code, code_map):
     return code_map[c] * base ** (len(code) - 1) + sub_solve(base, code[1:], code_map)
 
 
-def solve(code):
+def solve_recursive(code):
     base = get_base(code)
     code_map = {code[0]: 1}
     val = base ** (len(code) - 1)
     return val + sub_solve(base, code[1:], code_map)
 
-def read_file(path):
-    tests = []
-    with open(path) as f:
-        l = int(f.readline())
-        return [l.strip() for l in f.readlines()]
+
+HORNER_BLOCK = 64
+
+
+def assign_digits(code):
+    """Digits of ``code`` in one pass: new symbols get 1, 0, 2, 3, ... in order."""
+    code_map = {}
+    digits = []
+    next_digit = 1
+    for c in code:
+        d = code_map.get(c)
+        if d is None:
+            d = code_map[c] = next_digit
+            next_digit = 0 if len(code_map) == 1 else len(code_map)
+        digits.append(d)
+    return digits
+
+
+def horner(digits, base, start=0, end=None):
+    value = 0
+    for d in digits[start:end]:
+        value = value * base + d
+    return value
+
+
+def evaluate(digits, base, number=int):
+    """Value of ``digits`` (most significant first) in ``base``.
+
+    Runs of ``HORNER_BLOCK`` digits are evaluated with Horner's method and
+    then merged pairwise (``high * base ** len(low) + low``), so the big
+    multiplications are balanced instead of growing one digit at a time.
+    ``number`` is the type used for the merges.
+    """
+    values = [(number(horner(digits, base, start, start + HORNER_BLOCK)),
+               len(digits[start:start + HORNER_BLOCK]))
+              for start in range(0, len(digits), HORNER_BLOCK)]
+    powers = {}
+    while len(values) > 1:
+        merged = []
+        for pos in range(0, len(values) - 1, 2):
+            (high, _), (low, length) = values[pos], values[pos + 1]
+            if length not in powers:
+                powers[length] = number(base) ** length
+            merged.append((high * powers[length] + low, values[pos][1] + length))
+        if len(values) % 2:
+            merged.append(values[-1])
+        values = merged
+    return values[0][0] if values else number(0)
+
+
+EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX,
+                        traps=[decimal.Inexact, decimal.Rounded])
+
+
+def solve(code):
+    digits = assign_digits(code)
+    return evaluate(digits, max(2, len(set(digits))))
+
+
+def solve_decimal(code):
+    """Like ``solve`` but as an exact ``Decimal``.
+
+    Converting a huge int to its decimal string is quadratic (and limited
+    by ``sys.set_int_max_str_digits``), a ``Decimal`` is printed in linear
+    time and its big multiplications are fast too.
+    """
+    return decimal_value(assign_digits(code))
+
+
+def decimal_value(digits):
+    with decimal.localcontext(EXACT):
+        return evaluate(digits, max(2, len(set(digits))), decimal.Decimal)
+
+
+def canonical_pattern(code):
+    """Key shared by all the codes with the same symbols pattern ("cats" and "dogs")."""
+    digits = assign_digits(code)
+    return bytes(digits) if max(digits, default=0) < 256 else tuple(digits)
+
+
+PATTERN_MAX_LENGTH = 1000
+
+
+class PatternCache(object):
+    """Bounded LRU cache of the answers keyed by ``canonical_pattern``.
+
+    Codes longer than ``max_length`` symbols are solved without caching
+    them (and they are not counted in ``info()``): with at most ``maxsize``
+    patterns the cache never holds more than about
+    ``maxsize * max_length`` symbols.
+    """
+
+    def __init__(self, maxsize=4096, max_length=PATTERN_MAX_LENGTH):
+        self._answer = functools.lru_cache(maxsize)(self._solve_pattern)
+        self.max_length = max_length
+
+    @staticmethod
+    def _solve_pattern(pattern):
+        return str(decimal_value(list(pattern)))
+
+    def answer(self, code):
+        if len(code) > self.max_length:
+            return str(solve_decimal(code))
+        return self._answer(canonical_pattern(code))
+
+    def info(self):
+        """``(hits, misses, maxsize, currsize)`` as ``functools.lru_cache``."""
+        return self._answer.cache_info()
+
+    def clear(self):
+        self._answer.cache_clear()
+
+
+PATTERN_CACHE = PatternCache()
+
+
+def solve_many(codes, cache=PATTERN_CACHE):
+    """Answers (as printed in the output) of all ``codes``; see ``cache.info()`` for the hits."""
+    return [cache.answer(code) for code in codes]
+
+
+def parse_test_case(tokens):
+    return tokens.word()
+
+
+def do_single(code):
+    return PATTERN_CACHE.answer(code)
 
 class Test(unittest.TestCase):
+    def _check_fixture(self, do_file, **kw):
+        """Solve the small practice input with ``do_file`` and compare it with the fixture."""
+        f_in_name = file_name("in")
+        f_out_name = file_name("out")
+        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
+            self.skipTest("Both small in and out should be present")
+        with open(f_in_name) as f_in, open(f_out_name) as fixture, FixtureComparator(fixture) as f_out:
+            do_file(f_in, f_out, **kw)
+
 
     def test_get_base(self):
         self.assertEqual(2, get_base("a"))
@@ -51,12 +196,81 @@ class Test(unittest.TestCase):
     def test_ex_2(self):
         self.assertEqual(75, solve("cats"))
 
+    def test_assign_digits(self):
+        self.assertEqual([1], assign_digits("a"))
+        self.assertEqual([1, 0, 2, 3], assign_digits("cats"))
+        self.assertEqual([1, 1, 0, 0, 1, 0, 0, 1], assign_digits("11001001"))
+        self.assertEqual([1, 0, 0, 1, 2, 3], assign_digits("zoozyx"))
+
+    def test_evaluate(self):
+        for base in [2, 3, 10, 36]:
+            digits = [(i * 7) % base for i in range(1000)]
+            expected = int("".join("0123456789abcdefghijklmnopqrstuvwxyz"[d] for d in digits), base)
+            self.assertEqual(expected, evaluate(digits, base))
+        self.assertEqual(0, evaluate([], 2))
+
+    def test_solve_as_recursive(self):
+        for code in ["a", "ab", "100", "11001001", "cats", "zig", "howareyou", "abcabcabcxyz" * 50]:
+            self.assertEqual(solve_recursive(code), solve(code))
+
+    def test_long_code(self):
+        self.assertEqual(2 ** 100000 - 1, solve("a" * 100000))
+        self.assertEqual(2 ** 99999, solve("a" + "b" * 99999))
+
+    def test_do_single(self):
+        for code in ["a", "11001001", "cats", "abcabcabcxyz" * 50]:
+            self.assertEqual(str(solve(code)), do_single(code))
+        with decimal.localcontext(EXACT):
+            expected = str(decimal.Decimal(2) ** 100000 - 1)
+        self.assertEqual(expected, do_single("a" * 100000))
+
+    def test_canonical_pattern(self):
+        self.assertEqual(canonical_pattern("cats"), canonical_pattern("dogs"))
+        self.assertEqual(bytes([1, 0, 2, 3]), canonical_pattern("abcd"))
+        self.assertNotEqual(canonical_pattern("cats"), canonical_pattern("cass"))
+
+    def test_solve_many(self):
+        cache = PatternCache()
+        self.assertEqual(["75", "75", "11", "75", "201"],
+                         solve_many(["cats", "dogs", "zig", "cats", "11001001"], cache))
+        info = cache.info()
+        self.assertEqual((2, 3, 3), (info.hits, info.misses, info.currsize))
+        cache.clear()
+        self.assertEqual(0, cache.info().currsize)
+
+    def test_solve_many_bounded(self):
+        cache = PatternCache(maxsize=1)
+        solve_many(["cats", "zig", "dogs"], cache)
+        self.assertEqual((0, 3, 1), (cache.info().hits, cache.info().misses, cache.info().currsize))
+
+    def test_solve_many_long_codes(self):
+        cache = PatternCache(max_length=4)
+        self.assertEqual(["75", "201", "201"], solve_many(["cats", "11001001", "22112112"], cache))
+        self.assertEqual((0, 1, 1), (cache.info().hits, cache.info().misses, cache.info().currsize))
+
+    def test_parse_test_case(self):
+        si = tokenize(StringIO("""11001001
+cats
+"""))
+        self.assertEqual("11001001", parse_test_case(si))
+        self.assertEqual("cats", parse_test_case(si))
+
+    def test_solution(self):
+        self._check_fixture(do)
+
+
+def case_metrics(code):
+    return {"symbols": len(code), "base": get_base(code)}
+
+
+def do(f_in, f_out, log=runner.none_log, jobs=1, flush_every=0):
+    runner.do(f_in, f_out, parse_test_case, do_single, log, jobs, flush_every)
+
+
+def file_name(direction, dimension="small", nr=NR):
+    return runner.file_name(direction, dimension, nr)
+
 
 if __name__ == "__main__":
-    source = sys.argv[1]
-    dest = sys.stdout
-    if len(sys.argv)>2:
-        dest = open(sys.argv[2], "w")
-    test = read_file(source)
-    for num, code in enumerate(test):
-        dest.write("Case #%d: %d\n" % (num+1, solve(code)))
\ No newline at end of file
+    runner.main(parse_test_case, do_single, NR, metrics=case_metrics)
+    sys.stderr.write("Pattern cache: {}\n".format(PATTERN_CACHE.info()))
@@ -1,11 +1,28 @@
 import math
+import os
 import unittest
+from functools import partial
 from io import StringIO
 
 import sys
-from operator import attrgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from codejam import runner
+from codejam.output import BufferedWriter, FixtureComparator
+from codejam.tokens import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Set nr to  A, B or C
+NR = "B"
 
 class Obj(object):
+    __slots__ = ("x", "y", "z", "vx", "vy", "vz")
+
     def __init__(self, x, y, z, vx, vy, vz):
         self.x, self.y, self.z, self.vx, self.vy, self.vz = x, y, z, vx, vy, vz
 
@@ -26,14 +43,70 @@ def mean(values):
 
 
 class M(Obj):
+    __slots__ = ("n", "_objs", "_cloud")
+
     def __init__(self, *objs):
         args = [mean([getattr(o, a) for o in objs]) for a in ("x", "y", "z", "vx", "vy", "vz")]
         super(M, self).__init__(*args)
-        self.objs = objs
+        self.n = len(objs)
+        self._objs = objs
+        self._cloud = None
+
+    @classmethod
+    def from_sums(cls, sums, n):
+        """M of ``n`` particles given the six sums of their coordinates.
+
+        The particles are not known: ``objs`` and ``cloud`` raise ValueError.
+        """
+        m = cls.__new__(cls)
+        Obj.__init__(m, *[s / n for s in sums])
+        m.n = n
+        m._objs = None
+        m._cloud = None
+        return m
+
+    @classmethod
+    def from_array(cls, cloud):
+        """M of the particles in the rows of a (N x 6) integer numpy array.
+
+        The sums are exact int64 sums and are divided as python ints, so
+        the means are the same as the ones of ``M(*objs)``.
+        """
+        m = cls.from_sums(cloud.sum(axis=0).tolist(), len(cloud))
+        m._cloud = cloud
+        return m
+
+    def _check_particles(self):
+        if self._objs is None and self._cloud is None:
+            raise ValueError("M of {} particles built from their sums: the particles are not kept".format(self.n))
+
+    @property
+    def objs(self):
+        self._check_particles()
+        if self._objs is None:
+            self._objs = tuple(Obj(*row) for row in self._cloud.tolist())
+        return self._objs
+
+    @property
+    def cloud(self):
+        """The particles as a (N x 6) numpy array."""
+        self._check_particles()
+        if self._cloud is None:
+            self._cloud = np.array([o.data for o in self._objs], dtype=np.int64).reshape(-1, 6)
+        return self._cloud
+
+    def trajectory(self, times):
+        """The centers (T x 3) and their distances from the origin (T) at the T ``times``, with numpy.
+
+        Every value is computed with the same float operations of
+        ``center()`` and ``distance()``, so they are the ones of a single time.
+        """
+        centers, distances = trajectories([self], times)
+        return centers[0], distances[0]
 
 
 def parse_obj_line(line):
-    return Obj(*map(int, line.split(" ", 5)))
+    return Obj(*map(int, line.split()))
 
 
 def norm_quad(x, y, z):
@@ -53,12 +126,103 @@ def min_time(o):
     return -(x * vx + y * vy + z * vz) / norm_quad(vx, vy, vz)
 
 
-def parse_m(sio):
-    n = int(sio.readline())
-    return M(*[parse_obj_line(sio.readline()) for _ in range(n)])
+def parse_cloud(tokens):
+    """The next cloud as a (N x 6) int64 numpy array, parsed by numpy from the input bytes.
+
+    ``np.fromstring`` saturates the values out of int64: a cloud with a
+    saturated value is parsed again with python ints, which raise.
+    """
+    n = tokens.int()
+    text = tokens.span(6 * n)
+    cloud = np.fromstring(text, dtype=np.int64, sep=" ")
+    info = np.iinfo(np.int64)
+    if len(cloud) != 6 * n or (cloud == info.max).any() or (cloud == info.min).any():
+        cloud = np.array(list(map(int, text.split())), dtype=np.int64)
+    return cloud.reshape(n, 6)
+
+
+def parse_m(tokens):
+    if np is not None:
+        return M.from_array(parse_cloud(tokens))
+    n = tokens.int()
+    values = tokens.ints(6 * n)
+    return M(*[Obj(*values[i:i + 6]) for i in range(0, 6 * n, 6)])
+
+
+class MAccumulator(object):
+    """Running exact sums of a cloud: O(1) memory whatever the number of particles."""
+
+    def __init__(self):
+        self.n = 0
+        self.sums = [0] * 6
+
+    def add(self, x, y, z, vx, vy, vz):
+        for pos, value in enumerate((x, y, z, vx, vy, vz)):
+            self.sums[pos] += value
+        self.n += 1
+
+    def add_values(self, values):
+        """Add the particles in a flat list of coordinates (6 values each)."""
+        if len(values) % 6:
+            raise ValueError("Incomplete particle")
+        for pos in range(6):
+            self.sums[pos] += sum(values[pos::6])
+        self.n += len(values) // 6
+
+    def m(self):
+        return M.from_sums(self.sums, self.n)
+
+
+STREAM_CHUNK = 4096
+
+
+def parse_m_stream(tokens, chunk=STREAM_CHUNK):
+    """Like ``parse_m`` but reading ``chunk`` particles at a time into an ``MAccumulator``."""
+    n = tokens.int()
+    accumulator = MAccumulator()
+    for start in range(0, n, chunk):
+        accumulator.add_values(tokens.ints(6 * min(chunk, n - start)))
+    return accumulator.m()
+
+
+def parse_clouds(tokens, tests):
+    """All the clouds stacked in a single (N x 6) array and the number of particles of each."""
+    clouds = [parse_cloud(tokens) for _ in range(tests)]
+    return np.concatenate(clouds), [len(c) for c in clouds]
+
+
+def centers_of_mass(stacked, counts):
+    """The M of every cloud of ``parse_clouds`` with a single reduction."""
+    offsets = np.cumsum([0] + counts[:-1])
+    sums = np.add.reduceat(stacked, offsets, axis=0).tolist()
+    return [M.from_sums(s, n) for s, n in zip(sums, counts)]
+
+
+def trajectories(ms, times):
+    """Centers (C x T x 3) and distances (C x T) of the C centers of mass ``ms``.
+
+    ``times`` are the same T times for every cloud, or a (C x T) array
+    with the times of each cloud.
+    """
+    data = np.array([m.data for m in ms], dtype=np.float64).reshape(-1, 6)
+    times = np.asarray(times, dtype=np.float64)
+    if times.ndim == 1:
+        times = np.broadcast_to(times, (len(data), len(times)))
+    centers = data[:, np.newaxis, :3] + times[:, :, np.newaxis] * data[:, np.newaxis, 3:]
+    squares = centers * centers
+    return centers, np.sqrt(squares[..., 0] + squares[..., 1] + squares[..., 2])
 
 
 class Test(unittest.TestCase):
+    def _check_fixture(self, do_file, **kw):
+        """Solve the small practice input with ``do_file`` and compare it with the fixture."""
+        f_in_name = file_name("in")
+        f_out_name = file_name("out")
+        if not all(map(os.path.isfile, [f_in_name, f_out_name])):
+            self.skipTest("Both small in and out should be present")
+        with open(f_in_name) as f_in, open(f_out_name) as fixture, FixtureComparator(fixture) as f_out:
+            do_file(f_in, f_out, **kw)
+
     def test_obj(self):
         o = Obj(2, 3, 0, 3, 1, -2)
         self.assertEqual((2, 3, 0), o.center())
@@ -95,6 +259,8 @@ class Test(unittest.TestCase):
     def test_parse_obj(self):
         o = parse_obj_line("-5 0 0 1 0 0")
         self.assertEqual((-5, 0, 0, 1, 0, 0), o.data)
+        o = parse_obj_line("-5  0 0 1 0 0\r\n")
+        self.assertEqual((-5, 0, 0, 1, 0, 0), o.data)
 
     def test_parse_m(self):
         sio = StringIO("""3
@@ -102,14 +268,113 @@ class Test(unittest.TestCase):
 -7 0 0 1 0 0
 -6 3 0 1 0 0
 """)
-        m = parse_m(sio)
+        m = parse_m(tokenize(sio))
         self.assertEqual((-5, 0, 0, 1, 0, 0), m.objs[0].data)
         self.assertEqual((-7, 0, 0, 1, 0, 0), m.objs[1].data)
         self.assertEqual((-6, 3, 0, 1, 0, 0), m.objs[2].data)
 
-
-def usage():
-    print("""{} <input_file> [output_file]""".format(sys.argv[0]))
+    def test_accumulator(self):
+        objs = [Obj(1, 0, 0, 0, 1, 0), Obj(0, 0, 1, 0, 1, 0), Obj(0, 1, 0, 0, 0, 1)]
+        accumulator = MAccumulator()
+        accumulator.add(*objs[0].data)
+        accumulator.add_values(objs[1].data + objs[2].data)
+        self.assertEqual(3, accumulator.n)
+        self.assertEqual(M(*objs).data, accumulator.m().data)
+        with self.assertRaises(ValueError):
+            accumulator.add_values([1, 2, 3])
+
+    def test_m_from_sums(self):
+        m = M.from_sums([3, 0, 6, -3, 0, 0], 3)
+        self.assertEqual((1, 0, 2, -1, 0, 0), m.data)
+        with self.assertRaises(ValueError):
+            m.objs
+        with self.assertRaises(ValueError):
+            m.cloud
+
+    def test_parse_m_stream(self):
+        text = "5\n" + "".join("{} 1 -{} 3 {} 0\n".format(i, i * i, 7 - i) for i in range(5))
+        for chunk in [1, 2, 10]:
+            m = parse_m_stream(tokenize(StringIO(text)), chunk)
+            self.assertEqual(parse_m(tokenize(StringIO(text))).data, m.data)
+
+    def test_solution_stream(self):
+        self._check_fixture(runner.do, parse_test_case=partial(parse_m_stream, chunk=2), do_single=do_single)
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_m_from_array(self):
+        objs = [Obj(1, 0, 0, 0, 1, 0), Obj(0, 0, 1, 0, 1, 0), Obj(0, 1, 0, 0, 0, 1)]
+        m = M.from_array(np.array([o.data for o in objs]))
+        self.assertEqual(M(*objs).data, m.data)
+        self.assertEqual((0, 0, 1, 0, 1, 0), m.objs[1].data)
+        self.assertEqual([[1, 0, 0, 0, 1, 0]], M(objs[0]).cloud.tolist())
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_parse_cloud(self):
+        cloud = parse_cloud(tokenize(StringIO("2\n-5 0 0 1 0 0\r\n-7  0 0 1 0 {}\n".format(2 ** 63 - 1))))
+        self.assertEqual(np.int64, cloud.dtype)
+        self.assertEqual([[-5, 0, 0, 1, 0, 0], [-7, 0, 0, 1, 0, 2 ** 63 - 1]], cloud.tolist())
+        with self.assertRaises(OverflowError):
+            parse_cloud(tokenize(StringIO("1\n1 2 3 4 5 {}\n".format(2 ** 63))))
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_centers_of_mass(self):
+        sio = StringIO("""3
+-5 0 0 1 0 0
+-7 0 0 1 0 0
+-6 3 0 1 0 0
+1
+1 2 3 4 5 6
+""")
+        stacked, counts = parse_clouds(tokenize(sio), 2)
+        self.assertEqual((4, 6), stacked.shape)
+        self.assertEqual([3, 1], counts)
+        ms = centers_of_mass(stacked, counts)
+        self.assertEqual((-6, 1, 0, 1, 0, 0), ms[0].data)
+        self.assertEqual((1, 2, 3, 4, 5, 6), ms[1].data)
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_trajectory(self):
+        m = M(Obj(1, 1, -1, -1, -1, 1), Obj(3, 1, 0, -2, 0, 1))
+        times = [0, 0.5, 1, 2]
+        centers, distances = m.trajectory(times)
+        self.assertEqual((4, 3), centers.shape)
+        self.assertEqual([m.center(t) for t in times], [tuple(c) for c in centers.tolist()])
+        self.assertEqual([distance(*m.center(t)) for t in times], distances.tolist())
+        self.assertEqual((0, 3), m.trajectory([])[0].shape)
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_trajectories(self):
+        sio = StringIO("""4
+1
+1 1 -1 -1 -1 1
+1
+1 1 -1 0 0 0
+2
+-5 0 0 1 0 0
+-7 0 0 1 0 0
+3
+4 -2 1 -3 1 0
+0 5 2 1 -2 2
+-1 0 3 -1 1 1
+""")
+        tokens = tokenize(sio)
+        ms = centers_of_mass(*parse_clouds(tokens, runner.read_tests_number(tokens)))
+        best = [max(min_time(m), 0) for m in ms]
+        grid = np.linspace(0, 10, 1001)
+        times = np.column_stack([np.tile(grid, (len(ms), 1)), best])
+        centers, distances = trajectories(ms, times)
+        self.assertEqual((4, 1002, 3), centers.shape)
+        for m, t, curve in zip(ms, best, distances):
+            self.assertEqual(do_single(m), "{} {}".format(curve[-1], t))
+            self.assertAlmostEqual(curve.min(), curve[-1])
+        self.assertEqual(ms[3].trajectory(grid)[1].tolist(), trajectories(ms, grid)[1][3].tolist())
+
+    @unittest.skipIf(np is None, "numpy not available")
+    def test_solution_batch(self):
+        self._check_fixture(do_batch)
+
+    def test_solution(self):
+        self._check_fixture(do)
 
 
 def do_single(m):
@@ -117,22 +382,45 @@ def do_single(m):
     return "{} {}".format(distance(*m.center(t)), t)
 
 
-def do(src, dest):
-    tests = int(src.readline())
-    test_cases = [parse_m(src) for _ in range(tests)]
-    for pos, m in enumerate(test_cases):
-        dest.write("Case #{}: ".format(pos + 1) + do_single(m) + "\n")
+def parse_test_case(tokens):
+    return parse_m(tokens)
+
+
+def case_metrics(m):
+    return {"particles": m.n}
+
+
+def do(f_in, f_out, log=runner.none_log, jobs=1, flush_every=0):
+    runner.do(f_in, f_out, parse_test_case, do_single, log, jobs, flush_every)
+
+
+def do_batch(f_in, f_out):
+    """Solve all the cases of ``f_in`` as a single stacked array."""
+    tokens = tokenize(f_in)
+    tests = runner.read_tests_number(tokens)
+    f_out = BufferedWriter(f_out)
+    for pos, m in enumerate(centers_of_mass(*parse_clouds(tokens, tests))):
+        runner.write_case_result(f_out, pos + 1, do_single(m))
+    f_out.flush()
+
+
+def file_name(direction, dimension="small", nr=NR):
+    return runner.file_name(direction, dimension, nr)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        usage()
-        sys.exit(-1)
-
-    src = open(sys.argv[1])
-    dest = sys.stdout
-    try:
-        dest = open(sys.argv[2], "w")
-    except IndexError:
-        pass
-    do(src, dest)
+    parser = runner.arg_parser()
+    parser.add_argument("--batch", action="store_true",
+                        help="solve all the cases as a single stacked numpy array")
+    parser.add_argument("--stream", action="store_true",
+                        help="keep only the running sums of every cloud in memory")
+    args = parser.parse_args()
+    if args.batch and np is None:
+        parser.error("--batch needs numpy")
+    if args.batch:
+        src, dst = runner.open_files(args, NR)
+        do_batch(src, dst)
+    elif args.stream:
+        runner.run(args, parse_m_stream, do_single, NR, case_metrics)
+    else:
+        runner.run(args, parse_test_case, do_single, NR, case_metrics)
@@ -0,0 +1 @@
+"""Helpers shared by all the Code Jam solutions of this repository."""
@@ -0,0 +1,262 @@
+"""Benchmarks for the solutions on synthetic inputs.
+
+For every problem a generator writes an input whose cases are ``scale``
+times bigger than the ones of the large practice file. The cases are
+parsed and solved through the solution's ``parse_test_case`` and
+``do_single`` (or the ``function`` of the problem) and the timings are
+stored as JSON; a previous report can be used as baseline to spot
+regressions.
+
+    python -m codejam.bench --scales 10 100 --output bench.json
+    python -m codejam.bench --baseline
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import unittest
+from io import StringIO
+
+from codejam.solvers import ROOT, load_solver
+from codejam import runner
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_SCALES = [10, 100, 1000]
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_TOLERANCE = 0.3
+
+Problem = collections.namedtuple("Problem", ["path", "generate", "function"], defaults=["do_single"])
+
+
+def generate_min_scalar_product(f_out, scale, rnd):
+    """10 cases of two vectors of ``800 * scale`` values in [-100000, 100000]."""
+    tests, n = 10, 800 * scale
+    f_out.write("{}\n".format(tests))
+    for _ in range(tests):
+        f_out.write("{}\n".format(n))
+        for _ in range(2):
+            f_out.write(" ".join(str(rnd.randint(-100000, 100000)) for _ in range(n)) + "\n")
+    return tests * n
+
+
+def generate_milkshakes(f_out, scale, rnd):
+    """5 shops of ``2000 * scale`` flavors and customers, at most one malted flavor each."""
+    tests, n = 5, 2000 * scale
+    f_out.write("{}\n".format(tests))
+    elements = 0
+    for _ in range(tests):
+        f_out.write("{}\n{}\n".format(n, n))
+        for _ in range(n):
+            flavors = rnd.sample(range(1, n + 1), min(n, rnd.choice([1, 1, 2, 3])))
+            malted = rnd.randrange(len(flavors) + 1)
+            pairs = ["{} {}".format(f, int(pos == malted)) for pos, f in enumerate(flavors)]
+            f_out.write("{} {}\n".format(len(flavors), " ".join(pairs)))
+            elements += len(flavors)
+    return elements
+
+
+SYMBOLS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def generate_all_your_bases(f_out, scale, rnd):
+    """100 codes of ``60 * scale`` symbols."""
+    tests, n = 100, 60 * scale
+    f_out.write("{}\n".format(tests))
+    for _ in range(tests):
+        symbols = SYMBOLS[:rnd.randint(1, len(SYMBOLS))]
+        f_out.write("".join(rnd.choice(symbols) for _ in range(n)) + "\n")
+    return tests * n
+
+
+def generate_center_of_mass(f_out, scale, rnd):
+    """10 clouds of ``500 * scale`` particles with coordinates in [-5000, 5000]."""
+    tests, n = 10, 500 * scale
+    f_out.write("{}\n".format(tests))
+    for _ in range(tests):
+        f_out.write("{}\n".format(n))
+        for _ in range(n):
+            f_out.write(" ".join(str(rnd.randint(-5000, 5000)) for _ in range(6)) + "\n")
+    return tests * n
+
+
+PROBLEMS = collections.OrderedDict([
+    ("min_scalar_product", Problem("2008_Round1A/a_minimum_scalar_product.py",
+                                   generate_min_scalar_product)),
+    ("milkshakes", Problem("2008_Round1A/b_milkshakes.py", generate_milkshakes, "do_single_smart")),
+    ("milkshakes_propagation", Problem("2008_Round1A/b_milkshakes.py", generate_milkshakes)),
+    ("all_your_bases", Problem("2009_Round1C/a_all_your_bases.py", generate_all_your_bases)),
+    ("center_of_mass", Problem("2009_Round1C/b_center_of_mass.py", generate_center_of_mass)),
+])
+
+
+def measure(path, f_in_name, function="do_single"):
+    """Parse and solve with ``function`` all the cases of ``f_in_name``: return the two timings."""
+    solver = load_solver(path)
+    do_single = getattr(solver, function)
+    with open(f_in_name) as f_in:
+        start = time.perf_counter()
+        test_cases = list(runner.get_test_cases(f_in, solver.parse_test_case))
+        parse = time.perf_counter() - start
+        start = time.perf_counter()
+        for case in test_cases:
+            do_single(case)
+        solve = time.perf_counter() - start
+    return parse, solve
+
+
+def _measure_child(queue, path, f_in_name, function):
+    try:
+        queue.put(("ok",) + measure(path, f_in_name, function))
+    except BaseException as e:
+        queue.put(("error: " + type(e).__name__, None, None))
+
+
+def measure_isolated(path, f_in_name, timeout, function="do_single"):
+    """Run ``measure`` in a child process, giving up after ``timeout`` seconds."""
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_measure_child, args=(queue, path, f_in_name, function))
+    child.start()
+    child.join(timeout)
+    if child.is_alive():
+        child.terminate()
+        child.join()
+        return "timeout", None, None
+    if queue.empty():
+        return "error: exit code {}".format(child.exitcode), None, None
+    return queue.get()
+
+
+def bench_problem(problem, scales, timeout=DEFAULT_TIMEOUT, seed=0, log=runner.none_log):
+    """Measure ``problem`` at every scale; stop at the first scale that fails."""
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            f_in_name = os.path.join(tmp, "input.in")
+            with open(f_in_name, "w") as f_in:
+                elements = problem.generate(f_in, scale, random.Random(seed))
+            status, parse, solve = measure_isolated(problem.path, f_in_name, timeout, problem.function)
+        result = {"scale": scale, "elements": elements, "status": status}
+        if status == "ok":
+            result.update(parse=parse, solve=solve, throughput=elements / max(parse + solve, 1e-9))
+        name = problem.path if problem.function == "do_single" else "{} {}".format(problem.path, problem.function)
+        log(format_result(name, result))
+        results.append(result)
+        if status != "ok":
+            break
+    return results
+
+
+def bench(names, scales, timeout=DEFAULT_TIMEOUT, seed=0, log=runner.none_log):
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scales": scales,
+        "results": {name: bench_problem(PROBLEMS[name], scales, timeout, seed, log) for name in names},
+    }
+
+
+def format_result(name, result):
+    if result["status"] != "ok":
+        return "{:<45} x{:<5} {}".format(name, result["scale"], result["status"])
+    return "{:<45} x{:<5} parse {:9.4f}s solve {:9.4f}s {:14.0f} elements/s".format(
+        name, result["scale"], result["parse"], result["solve"], result["throughput"])
+
+
+def regressions(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """List the (problem, scale, reason) that got worse than ``baseline``.
+
+    A scale is a regression when its throughput dropped by more than
+    ``tolerance`` or when it doesn't complete anymore.
+    """
+    found = []
+    for name, results in report["results"].items():
+        current = {r["scale"]: r for r in results}
+        for old in baseline.get("results", {}).get(name, []):
+            new = current.get(old["scale"])
+            if new is None or old["status"] != "ok":
+                continue
+            if new["status"] != "ok":
+                found.append((name, old["scale"], new["status"]))
+            elif new["throughput"] < old["throughput"] * (1 - tolerance):
+                found.append((name, old["scale"], "throughput {:.0f} < {:.0f}".format(
+                    new["throughput"], old["throughput"])))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam.bench")
+    parser.add_argument("problems", nargs="*", metavar="problem",
+                        help="problems to run, all if omitted: " + ", ".join(PROBLEMS))
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="case sizes as multiples of the large practice ones")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds before giving up a single measure")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE, metavar="JSON",
+                        help="compare the report with this file (default: the committed one)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed throughput drop before flagging a regression")
+    args = parser.parse_args(argv)
+    for name in args.problems:
+        if name not in PROBLEMS:
+            parser.error("unknown problem " + name)
+    report = bench(args.problems or list(PROBLEMS), args.scales, args.timeout, args.seed, print)
+    if args.output:
+        with open(args.output, "w") as f_out:
+            json.dump(report, f_out, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f_in:
+            found = regressions(report, json.load(f_in), args.tolerance)
+        for name, scale, reason in found:
+            print("REGRESSION {} x{}: {}".format(name, scale, reason))
+        return 1 if found else 0
+    return 0
+
+
+class Test(unittest.TestCase):
+    def test_generators(self):
+        for name, problem in PROBLEMS.items():
+            f_in = StringIO()
+            elements = problem.generate(f_in, 1, random.Random(0))
+            self.assertGreater(elements, 0)
+            solver = load_solver(problem.path)
+            test_cases = list(runner.get_test_cases(StringIO(f_in.getvalue()), solver.parse_test_case))
+            self.assertTrue(test_cases, name)
+            self.assertTrue(callable(getattr(solver, problem.function)), name)
+
+    def test_generators_are_deterministic(self):
+        texts = []
+        for _ in range(2):
+            f_in = StringIO()
+            generate_all_your_bases(f_in, 2, random.Random(3))
+            texts.append(f_in.getvalue())
+        self.assertEqual(texts[0], texts[1])
+
+    def test_bench_problem(self):
+        problem = PROBLEMS["all_your_bases"]
+        results = bench_problem(problem, [1], timeout=60)
+        self.assertEqual("ok", results[0]["status"])
+        self.assertGreater(results[0]["throughput"], 0)
+
+    def test_regressions(self):
+        def report(*throughput):
+            return {"results": {"p": [
+                {"scale": s, "status": "ok" if t else "timeout", "throughput": t}
+                for s, t in zip([1, 10], throughput)]}}
+
+        self.assertEqual([], regressions(report(100, 10), report(100, 10)))
+        self.assertEqual([], regressions(report(80, 10), report(100, 10), 0.3))
+        self.assertEqual([("p", 1, "throughput 50 < 100")], regressions(report(50, 10), report(100, 10)))
+        self.assertEqual([("p", 10, "timeout")], regressions(report(100, None), report(100, 10)))
+        self.assertEqual([], regressions(report(100, 10), report(100, None)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""On-disk cache of the case results.
+
+A result is stored under the hash of the solution module source and the
+hash of the case raw input text, so changing the solution invalidates
+all its results and a case is found again wherever it appears in an
+input. The cache is bounded in size: the least recently used results are
+evicted first.
+
+    python -m codejam.cache stats
+    python -m codejam.cache clear [2008_Round1A/b_milkshakes.py ...]
+"""
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from codejam.solvers import ROOT, load_solver
+
+DEFAULT_DIRECTORY = os.environ.get("CODEJAM_CACHE", os.path.join(ROOT, ".codejam_cache"))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def solver_version(do_single):
+    """Hash of the source of the module that defines ``do_single`` (unwrapping ``functools.partial``)."""
+    while isinstance(do_single, functools.partial):
+        do_single = do_single.func
+    module_name = getattr(do_single, "__module__", None)
+    path = getattr(sys.modules.get(module_name or ""), "__file__", None)
+    h = hashlib.sha256()
+    if path and os.path.isfile(path):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    else:
+        name = getattr(do_single, "__qualname__", type(do_single).__qualname__)
+        h.update("{}.{}".format(module_name, name).encode())
+    return h.hexdigest()[:16]
+
+
+class CaseHash(object):
+    """Hash of the bytes fed to ``update()`` without the whitespace around them.
+
+    The case text is hashed as it is parsed (see ``Tokens.hash_from()``),
+    so it is never kept in memory.
+    """
+
+    def __init__(self):
+        self._h = hashlib.sha256()
+        self._started = False
+        self._spaces = b""
+
+    def update(self, data):
+        if not self._started:
+            data = data.lstrip()
+            self._started = bool(data)
+        body = data.rstrip()
+        if body:
+            self._h.update(self._spaces)
+            self._h.update(body)
+            self._spaces = data[len(body):]
+        else:
+            self._spaces += data
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+
+def case_key(raw):
+    """The key of the case with input text ``raw``."""
+    h = CaseHash()
+    h.update(raw)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, version, key):
+        return os.path.join(self.directory, version, key)
+
+    def get(self, version, key):
+        """The cached result text of the case ``key``, ``None`` if missing."""
+        path = self._path(version, key)
+        try:
+            with open(path) as f:
+                result = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def put(self, version, key, result):
+        path = self._path(version, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(result)
+        os.replace(tmp, path)
+
+    def _entries(self):
+        """``(mtime, size, path)`` of the results: the ones removed meanwhile by another run are skipped."""
+        for version in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            try:
+                entries = list(os.scandir(os.path.join(self.directory, version)))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def size(self):
+        """(number of results, bytes)"""
+        sizes = [size for _, size, _ in self._entries()]
+        return len(sizes), sum(sizes)
+
+    def evict(self):
+        """Remove the least recently used results until the cache fits ``max_bytes``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self, version=None):
+        """Invalidate the results of a solution version, or all of them."""
+        path = self.directory if version is None else os.path.join(self.directory, version)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class CachedSolver(object):
+    """A ``do_single`` that takes ``(key, case)`` and looks in the cache first."""
+
+    def __init__(self, do_single, cache):
+        self.do_single = do_single
+        self.cache = cache
+        self.version = solver_version(do_single)
+
+    def __call__(self, item):
+        key, case = item
+        result = self.cache.get(self.version, key)
+        if result is None:
+            result = str(self.do_single(case))
+            self.cache.put(self.version, key, result)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam.cache")
+    parser.add_argument("--dir", default=DEFAULT_DIRECTORY, help="cache directory")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("solvers", nargs="*", help="clear only the results of these solutions")
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.dir)
+    if args.command == "clear" and args.solvers:
+        for path in args.solvers:
+            cache.clear(solver_version(load_solver(os.path.abspath(path)).do_single))
+    elif args.command == "clear":
+        cache.clear()
+    results, size = cache.size()
+    print("{}: {} results, {} bytes".format(cache.directory, results, size))
+    return 0
+
+
+def _double(value):
+    return 2 * value
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self._tmp.name, max_bytes=10)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_case_key(self):
+        self.assertEqual(case_key(b"1 2 3"), case_key(b"\n 1 2 3\r\n"))
+        self.assertNotEqual(case_key(b"1 2 3"), case_key(b"1 2  3"))
+        self.assertEqual(hashlib.sha256(b"1 2\n3").hexdigest(), case_key(b" 1 2\n3\n"))
+        for blocks in [[b"\n", b" 1", b" 2", b"\n", b"3", b"\n"], [b"\n 1 2\n3\n"], [b"\n 1 ", b"", b"2\n3\n", b" "]]:
+            h = CaseHash()
+            for block in blocks:
+                h.update(block)
+            self.assertEqual(case_key(b"1 2\n3"), h.hexdigest())
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get("v1", case_key(b"1 2 3")))
+        self.cache.put("v1", case_key(b"1 2 3"), "6")
+        self.assertEqual("6", self.cache.get("v1", case_key(b"\n1 2 3\n")))
+        self.assertIsNone(self.cache.get("v2", case_key(b"1 2 3")))
+        self.assertEqual((1, 1), self.cache.size())
+
+    def test_evict(self):
+        for pos in range(5):
+            self.cache.put("v", str(pos), "abcd")
+            os.utime(self.cache._path("v", str(pos)), (pos, pos))
+        self.cache.get("v", "0")
+        self.cache.evict()
+        self.assertEqual((2, 8), self.cache.size())
+        self.assertEqual("abcd", self.cache.get("v", "0"))
+        self.assertEqual("abcd", self.cache.get("v", "4"))
+
+    def test_get_removed(self):
+        self.cache.put("v", "k", "abcd")
+        utime = os.utime
+
+        def removed_meanwhile(path, *args):
+            os.remove(path)
+            utime(path, *args)
+
+        os.utime = removed_meanwhile
+        try:
+            self.assertEqual("abcd", self.cache.get("v", "k"))
+        finally:
+            os.utime = utime
+        self.assertIsNone(self.cache.get("v", "k"))
+
+    def test_evict_removed(self):
+        for pos in range(5):
+            self.cache.put("v", str(pos), "abcd")
+            os.utime(self.cache._path("v", str(pos)), (pos, pos))
+        entries = self.cache._entries
+
+        def removed_meanwhile():
+            found = list(entries())
+            for pos in range(3):
+                os.remove(self.cache._path("v", str(pos)))
+            return iter(found)
+
+        self.cache._entries = removed_meanwhile
+        self.cache.evict()
+        del self.cache._entries
+        self.assertEqual((2, 8), self.cache.size())
+        self.assertEqual("abcd", self.cache.get("v", "4"))
+
+    def test_clear(self):
+        self.cache.put("v1", "1", "1")
+        self.cache.put("v2", "1", "2")
+        self.cache.clear("v1")
+        self.assertEqual((None, "2"), (self.cache.get("v1", "1"), self.cache.get("v2", "1")))
+        self.cache.clear()
+        self.assertEqual((0, 0), self.cache.size())
+
+    def test_cached_solver(self):
+        calls = []
+
+        def solve(case):
+            calls.append(case)
+            return case * 3
+
+        solver = CachedSolver(solve, self.cache)
+        self.assertEqual("9", solver(("k3", 3)))
+        self.assertEqual("9", solver(("k3", 3)))
+        self.assertEqual([3], calls)
+
+    def test_solver_version(self):
+        self.assertEqual(solver_version(_double), solver_version(Test))
+        self.assertEqual(solver_version(_double), solver_version(functools.partial(_double)))
+        self.assertEqual(64 // 4, len(solver_version(functools.partial(abs))))
+        self.assertNotEqual(solver_version(_double), solver_version(load_solver(
+            "2009_Round1C/a_all_your_bases.py").do_single))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Thin client of ``codejam.daemon``.
+
+It takes the place of ``python x.py <input> [output]``: the input (a path,
+or ``-`` to send the standard input bytes) is solved by the warm daemon
+and the output lines are written as they arrive. Only the standard
+library modules needed to talk to the socket are imported here, to keep
+the start up as short as possible. The input is sent by a thread while
+the output is read, so a big input can't fill both socket buffers and
+stall the client and the daemon.
+
+    python -m codejam.client 2008_Round1A/b_milkshakes B-large-practice.in out.txt
+    cat A-small-practice.in | python -m codejam.client a_all_your_bases -
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+
+SEND_SIZE = 1 << 16
+
+
+def default_socket():
+    return os.environ.get("CODEJAM_SOCKET", "/tmp/codejam-{}.sock".format(os.getuid()))
+
+
+def _send(s, request, f_in):
+    """Send the request line and the bytes of ``f_in`` (if any), then close the writing side."""
+    try:
+        s.sendall((json.dumps(request) + "\n").encode())
+        if f_in is not None:
+            for block in iter(lambda: f_in.read(SEND_SIZE), b""):
+                s.sendall(block)
+        s.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass  # the daemon stopped reading, or the response is over: its status says why
+
+
+def solve(problem, f_out, path=None, f_in=None, jobs=1, socket_path=None):
+    """Solve the file ``path`` (or the bytes read from ``f_in``) and write the output to ``f_out``.
+
+    Return the final status sent by the daemon: a dict with ``status``
+    ``"ok"`` or ``"error"`` (and its ``error`` message).
+    """
+    request = {"problem": problem, "jobs": jobs}
+    if path is not None:
+        request["path"] = os.path.abspath(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path or default_socket())
+        sender = threading.Thread(target=_send, args=(s, request, f_in if path is None else None), daemon=True)
+        sender.start()
+        try:
+            with s.makefile("r", newline="\n") as response:
+                for line in response:
+                    if line.startswith("\0"):
+                        return json.loads(line[1:])
+                    f_out.write(line)
+        finally:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sender.join()
+    return {"status": "error", "error": "connection closed by the daemon"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam.client")
+    parser.add_argument("problem", help="round/module, or just the module if it is unique")
+    parser.add_argument("source", help="input file, '-' for the standard input")
+    parser.add_argument("dest", nargs="?", help="output file (stdout if omitted)")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--socket", default=default_socket())
+    args = parser.parse_args(argv)
+    f_out = open(args.dest, "w") if args.dest else sys.stdout
+    try:
+        if args.source == "-":
+            result = solve(args.problem, f_out, f_in=sys.stdin.buffer, jobs=args.jobs, socket_path=args.socket)
+        else:
+            result = solve(args.problem, f_out, args.source, jobs=args.jobs, socket_path=args.socket)
+    finally:
+        f_out.flush()
+        if f_out is not sys.stdout:
+            f_out.close()
+    if result["status"] != "ok":
+        sys.stderr.write("Error: {}\n".format(result["error"]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Solve inputs in a long running process that keeps the solutions imported.
+
+Starting an interpreter and importing a solution costs more than solving a
+small input: when thousands of generated inputs are solved the daemon pays
+it once. It listens on a Unix domain socket; a request is a JSON line
+``{"problem": ..., "path": ..., "jobs": ...}``, followed by the input
+bytes when there is no ``path``. The ``Case #k: ...`` lines are streamed
+back in chunks as they are solved and the response ends with a line made
+of a NUL character and the JSON status. Every request is solved in a
+forked child, so requests run in parallel and don't share state.
+
+    python -m codejam.daemon [--socket PATH] &
+    python -m codejam.client 2008_Round1A/b_milkshakes B-large-practice.in out.txt
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from codejam import runner
+from codejam.client import default_socket, solve
+from codejam.solvers import ROOT, load_solver
+from codejam.suite import discover_solvers, problem_name, selected
+
+
+def load_solvers(root=ROOT):
+    """``{problem name: module}`` of all the solutions that can be run."""
+    solvers = {}
+    for path in discover_solvers(root):
+        module = load_solver(os.path.join(root, path))
+        if all(hasattr(module, a) for a in ("parse_test_case", "do_single")):
+            solvers[problem_name(path)] = module
+    return solvers
+
+
+def find_solver(solvers, problem):
+    """The solution called ``problem`` (round/module or just module): KeyError if not exactly one."""
+    if problem in solvers:
+        return solvers[problem]
+    found = [name for name in solvers if selected(name, [problem])]
+    if len(found) != 1:
+        raise KeyError("{} solutions match {!r}".format(len(found), problem))
+    return solvers[found[0]]
+
+
+class SolveHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        start = time.perf_counter()
+        f_out = io.TextIOWrapper(self.wfile, newline="\n", write_through=True)
+        try:
+            request = json.loads(self.rfile.readline())
+            solver = find_solver(self.server.solvers, request["problem"])
+            f_in = open(request["path"], "rb") if "path" in request else self.rfile
+            try:
+                runner.do(f_in, f_out, solver.parse_test_case, solver.do_single, jobs=request.get("jobs", 1))
+            finally:
+                if f_in is not self.rfile:
+                    f_in.close()
+            status = {"status": "ok", "seconds": time.perf_counter() - start}
+        except Exception as e:
+            status = {"status": "error", "error": "{}: {}".format(type(e).__name__, e)}
+        f_out.write("\0" + json.dumps(status) + "\n")
+        f_out.flush()
+        f_out.detach()
+        self.server.log("{} {}".format(status["status"], status.get("error", "")).rstrip())
+
+
+class _Daemon(socketserver.UnixStreamServer):
+    def __init__(self, socket_path, solvers, log=runner.none_log):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, SolveHandler)
+        self.solvers = solvers
+        self.log = log
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class ForkingDaemon(socketserver.ForkingMixIn, _Daemon):
+    pass
+
+
+class ThreadingDaemon(socketserver.ThreadingMixIn, _Daemon):
+    daemon_threads = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam.daemon", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--socket", default=default_socket())
+    parser.add_argument("--threads", action="store_true",
+                        help="solve the requests in threads instead of forked processes")
+    args = parser.parse_args(argv)
+    solvers = load_solvers()
+    server_class = ThreadingDaemon if args.threads else ForkingDaemon
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with server_class(args.socket, solvers, print) as server:
+        print("Listening on {} with {}".format(args.socket, ", ".join(sorted(solvers))))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+class Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.socket = os.path.join(cls._tmp.name, "codejam.sock")
+        cls.server = ThreadingDaemon(cls.socket, load_solvers())
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls._tmp.cleanup()
+
+    def test_find_solver(self):
+        solvers = load_solvers()
+        self.assertIs(solvers["2008_Round1A/b_milkshakes"], find_solver(solvers, "b_milkshakes"))
+        with self.assertRaises(KeyError):
+            find_solver(solvers, "2008_Round1A")
+
+    def test_solve_path(self):
+        directory = os.path.join(ROOT, "2009_Round1C")
+        f_in_name = os.path.join(directory, runner.file_name("in", "small", "A"))
+        f_out = io.StringIO()
+        result = solve("a_all_your_bases", f_out, f_in_name, socket_path=self.socket)
+        self.assertEqual("ok", result["status"])
+        with open(os.path.join(directory, runner.file_name("out", "small", "A"))) as fixture:
+            self.assertEqual(fixture.read(), f_out.getvalue())
+
+    def test_solve_bytes(self):
+        f_out = io.StringIO()
+        result = solve("2009_Round1C/a_all_your_bases", f_out, f_in=io.BytesIO(b"2\n11001001\ncats\n"),
+                       socket_path=self.socket)
+        self.assertEqual("ok", result["status"])
+        self.assertEqual("Case #1: 201\nCase #2: 75\n", f_out.getvalue())
+
+    def test_errors(self):
+        result = solve("unknown", io.StringIO(), f_in=io.BytesIO(b"1\n1\n"), socket_path=self.socket)
+        self.assertEqual("error", result["status"])
+        self.assertIn("KeyError", result["error"])
+        result = solve("a_all_your_bases", io.StringIO(), f_in=io.BytesIO(b"2\n1\n"), socket_path=self.socket)
+        self.assertEqual("error", result["status"])
+        self.assertIn("EOFError", result["error"])
+
+    def test_big_input(self):
+        codes = ["".join("0123456789abcdefghijklmnopqrstuvwxyz"[(i + j) % 36] for j in range(2000))
+                 for i in range(2000)]
+        data = "{}\n{}\n".format(len(codes), "\n".join(codes)).encode()
+        solver = find_solver(self.server.solvers, "a_all_your_bases")
+        expected = io.StringIO()
+        runner.do(io.StringIO(data.decode()), expected, solver.parse_test_case, solver.do_single)
+        self.assertGreater(min(len(data), len(expected.getvalue())), 1 << 19)
+        f_out, results = io.StringIO(), []
+        client = threading.Thread(target=lambda: results.append(
+            solve("a_all_your_bases", f_out, f_in=io.BytesIO(data), socket_path=self.socket)), daemon=True)
+        client.start()
+        client.join(30)
+        self.assertFalse(client.is_alive(), "the client and the daemon are stuck")
+        self.assertEqual("ok", results[0]["status"])
+        self.assertEqual(expected.getvalue(), f_out.getvalue())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,440 @@
+"""Differential testing of the engines of every solution.
+
+For every problem a generator makes random small cases, every engine
+(the reference brute force ones and the fast ones) solves them and the
+answers must be the same; an engine answers ``None`` for the cases out
+of its domain. The first case where they differ is shrunk to
+a minimal one and printed as an input file, ready to be solved by the
+solution script.
+
+    python -m codejam.fuzz --cases 5000 -j 4
+    python -m codejam.fuzz milkshakes --seed 7
+"""
+import argparse
+import collections
+import random
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from codejam import runner
+from codejam.solvers import load_solver
+
+DEFAULT_CASES = 1000
+BATCH = 100
+
+Fuzzer = collections.namedtuple("Fuzzer", ["path", "generate", "engines", "shrink", "format"])
+
+
+def smaller_ints(value):
+    """Candidates for an int closer to 0: 0, then ``value`` moved toward 0 by halving steps."""
+    step, sign = abs(value), 1 if value > 0 else -1
+    while step:
+        yield value - sign * step
+        step //= 2
+
+
+def _without(items, pos):
+    return items[:pos] + items[pos + 1:]
+
+
+def _replaced(items, pos, value):
+    return items[:pos] + [value] + items[pos + 1:]
+
+
+# Milkshakes: (n flavors, [[(flavor, malted), ...], ...]) with at most one malted choice per customer.
+
+def generate_milkshakes(rnd):
+    n = rnd.randint(1, 6)
+    customers = []
+    for _ in range(rnd.randint(1, 6)):
+        flavors = rnd.sample(range(1, n + 1), rnd.randint(1, min(n, 3)))
+        malted = rnd.randrange(len(flavors) + 1)
+        customers.append([(f, int(pos == malted)) for pos, f in enumerate(flavors)])
+    return n, customers
+
+
+def _milkshakes_answer(planning):
+    if planning is None:
+        return "IMPOSSIBLE"
+    return " ".join([str(int(f.is_malted)) for f in planning])
+
+
+def milkshakes_engines(solver):
+    def objects(case):
+        n, customers = case
+        return solver.MilkshakeShop(n), [solver.Customer.from_codes(2 * f + m for f, m in c) for c in customers]
+
+    def planner(planner_class):
+        def plan(case):
+            shop, customers = objects(case)
+            return _milkshakes_answer(planner_class(shop, *customers).plan())
+        return plan
+
+    def incremental(case):
+        shop, customers = objects(case)
+        planner = solver.IncrementalFlavorPlanner(shop)
+        keys = [planner.add_customer(c) for c in customers]
+        for c in reversed(customers):
+            planner.add_customer(c)
+        for key in keys:
+            planner.remove_customer(key)
+        return _milkshakes_answer(planner.plan())
+
+    def orders(case):
+        n, customers = case
+        orders = solver.Orders(n)
+        for c in customers:
+            orders.add([f for f, _ in c], [m for _, m in c])
+        return solver.do_single_orders(orders)
+
+    return collections.OrderedDict([
+        ("trivial", planner(solver.TrivialFlavorPlanner)),
+        ("smart", planner(solver.SmartFlavorPlanner)),
+        ("propagation", lambda case: solver.do_single(objects(case))),
+        ("incremental", incremental),
+        ("orders", orders),
+    ])
+
+
+def shrink_milkshakes(case):
+    n, customers = case
+    for pos in range(len(customers)):
+        if len(customers) > 1:
+            yield n, _without(customers, pos)
+    for flavor in range(n, 0, -1):
+        if n > 1:
+            reduced = [[(f - (f > flavor), m) for f, m in c if f != flavor] for c in customers]
+            reduced = [c for c in reduced if c]
+            if reduced:
+                yield n - 1, reduced
+    for pos, customer in enumerate(customers):
+        for choice, (f, m) in enumerate(customer):
+            if len(customer) > 1:
+                yield n, _replaced(customers, pos, _without(customer, choice))
+            if m:
+                yield n, _replaced(customers, pos, _replaced(customer, choice, (f, 0)))
+
+
+def format_milkshakes(case):
+    n, customers = case
+    lines = ["{} {}".format(len(c), " ".join("{} {}".format(f, m) for f, m in c)) for c in customers]
+    return "1\n{}\n{}\n{}\n".format(n, len(customers), "\n".join(lines))
+
+
+# Minimum scalar product: (v1, v2), sometimes with values (or products) that overflow int64.
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def generate_min_scalar_product(rnd):
+    n = rnd.randint(0, 7)
+    bound = rnd.choice([3, 100, 100000, 2 ** 40, 2 ** 70])
+    return tuple([rnd.randint(-bound, bound) for _ in range(n)] for _ in range(2))
+
+
+def min_scalar_product_engines(solver):
+    def local_search(case):
+        pair = solver.VectorPair(*case)
+        while True:
+            better = pair.better_permutation()
+            if better is pair:
+                return str(pair.scalar())
+            pair = better
+
+    def on_disk(case):
+        if not all(INT64_MIN <= value <= INT64_MAX for v in case for value in v):
+            return None
+        v1, v2 = solver.DiskVector(), solver.DiskVector()
+        v1.extend(case[0])
+        v2.extend(case[1])
+        return str(solver.do_single_on_disk(solver.DiskVectorPair(v1, v2, 2)))
+
+    return collections.OrderedDict([
+        ("local_search", local_search),
+        ("best_permutation", lambda case: str(solver.VectorPair(*case).best_permutation().scalar())),
+        ("min_scalar_product", lambda case: str(solver.min_scalar_product(*case))),
+        ("min_scalar_products", lambda case: str(solver.min_scalar_products([case[0]], [case[1]])[0])),
+        ("on_disk", on_disk),
+    ])
+
+
+def shrink_min_scalar_product(case):
+    v1, v2 = case
+    for pos in range(len(v1)):
+        yield _without(v1, pos), _without(v2, pos)
+    for pos in range(len(v1)):
+        for value in smaller_ints(v1[pos]):
+            yield _replaced(v1, pos, value), v2
+        for value in smaller_ints(v2[pos]):
+            yield v1, _replaced(v2, pos, value)
+
+
+def format_min_scalar_product(case):
+    v1, v2 = case
+    return "1\n{}\n{}\n{}\n".format(len(v1), " ".join(map(str, v1)), " ".join(map(str, v2)))
+
+
+# All your bases: a code of up to 10 symbols.
+
+def generate_all_your_bases(rnd):
+    symbols = "0123456789abcdefghijklmnopqrstuvwxyz"[:rnd.randint(1, 36)]
+    return "".join(rnd.choice(symbols) for _ in range(rnd.randint(1, 10)))
+
+
+def all_your_bases_engines(solver):
+    return collections.OrderedDict([
+        ("recursive", lambda code: str(solver.solve_recursive(code))),
+        ("horner", lambda code: str(solver.solve(code))),
+        ("decimal", lambda code: str(solver.solve_decimal(code))),
+        ("pattern_cache", solver.PatternCache().answer),
+    ])
+
+
+def shrink_all_your_bases(code):
+    for pos in range(len(code)):
+        if len(code) > 1:
+            yield code[:pos] + code[pos + 1:]
+    for pos, c in enumerate(code):
+        for symbol in sorted(set(code[:pos])):
+            if symbol < c:
+                yield code[:pos] + symbol + code[pos + 1:]
+
+
+def format_all_your_bases(code):
+    return "1\n{}\n".format(code)
+
+
+# Center of mass: a list of particles (x, y, z, vx, vy, vz).
+
+def generate_center_of_mass(rnd):
+    bound = rnd.choice([2, 10, 5000])
+    return [tuple(rnd.randint(-bound, bound) for _ in range(6)) for _ in range(rnd.randint(1, 5))]
+
+
+def center_of_mass_engines(solver):
+    def accumulator(particles):
+        acc = solver.MAccumulator()
+        acc.add_values([value for p in particles for value in p])
+        return solver.do_single(acc.m())
+
+    engines = collections.OrderedDict([
+        ("objects", lambda particles: solver.do_single(solver.M(*[solver.Obj(*p) for p in particles]))),
+        ("accumulator", accumulator),
+    ])
+    np = solver.np
+    if np is not None:
+        def trajectory(particles):
+            m = solver.M.from_array(np.array(particles, dtype=np.int64))
+            t = max(solver.min_time(m), 0)
+            return "{} {}".format(m.trajectory([t])[1].tolist()[0], t)
+
+        engines["array"] = lambda particles: solver.do_single(
+            solver.M.from_array(np.array(particles, dtype=np.int64)))
+        engines["batch"] = lambda particles: solver.do_single(
+            solver.centers_of_mass(np.array(particles, dtype=np.int64), [len(particles)])[0])
+        engines["trajectory"] = trajectory
+    return engines
+
+
+def shrink_center_of_mass(particles):
+    for pos in range(len(particles)):
+        if len(particles) > 1:
+            yield _without(particles, pos)
+    for pos, p in enumerate(particles):
+        for coordinate in range(6):
+            for value in smaller_ints(p[coordinate]):
+                yield _replaced(particles, pos, p[:coordinate] + (value,) + p[coordinate + 1:])
+
+
+def format_center_of_mass(particles):
+    return "1\n{}\n{}\n".format(len(particles), "\n".join(" ".join(map(str, p)) for p in particles))
+
+
+FUZZERS = collections.OrderedDict([
+    ("min_scalar_product", Fuzzer("2008_Round1A/a_minimum_scalar_product.py", generate_min_scalar_product,
+                                  min_scalar_product_engines, shrink_min_scalar_product,
+                                  format_min_scalar_product)),
+    ("milkshakes", Fuzzer("2008_Round1A/b_milkshakes.py", generate_milkshakes, milkshakes_engines,
+                          shrink_milkshakes, format_milkshakes)),
+    ("all_your_bases", Fuzzer("2009_Round1C/a_all_your_bases.py", generate_all_your_bases,
+                              all_your_bases_engines, shrink_all_your_bases, format_all_your_bases)),
+    ("center_of_mass", Fuzzer("2009_Round1C/b_center_of_mass.py", generate_center_of_mass,
+                              center_of_mass_engines, shrink_center_of_mass, format_center_of_mass)),
+])
+
+
+def load_engines(fuzzer):
+    return fuzzer.engines(load_solver(fuzzer.path) if fuzzer.path else None)
+
+
+def run_engines(engines, case, timings=None):
+    """``{engine: answer}`` for ``case``; an exception is an answer too (``error: ...``)."""
+    answers = collections.OrderedDict()
+    for name, engine in engines.items():
+        start = time.perf_counter()
+        try:
+            answers[name] = engine(case)
+        except Exception as e:
+            answers[name] = "error: {}: {}".format(type(e).__name__, e)
+        if timings is not None:
+            timings[name] += time.perf_counter() - start
+    return answers
+
+
+def disagree(answers):
+    return len(set(answers.values()) - {None}) > 1
+
+
+def fuzz_batch(fuzzer, seed, batch, cases):
+    """Solve ``cases`` random cases: return the time spent by every engine and the cases they disagree on."""
+    engines = load_engines(fuzzer)
+    rnd = random.Random("{}:{}:{}".format(fuzzer.path, seed, batch))
+    timings = collections.OrderedDict((name, 0.0) for name in engines)
+    failures = []
+    for _ in range(cases):
+        case = fuzzer.generate(rnd)
+        if disagree(run_engines(engines, case, timings)):
+            failures.append(case)
+    return timings, failures
+
+
+def shrink(fuzzer, engines, case):
+    """Apply the first step of ``fuzzer.shrink`` that keeps the disagreement until none does."""
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for candidate in fuzzer.shrink(case):
+            if disagree(run_engines(engines, candidate)):
+                case, shrunk = candidate, True
+                break
+    return case
+
+
+def _batches(fuzzer, cases, seed, jobs, batch):
+    args = [(fuzzer, seed, pos, min(batch, cases - start)) for pos, start in enumerate(range(0, cases, batch))]
+    if jobs <= 1:
+        for a in args:
+            yield fuzz_batch(*a)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(fuzz_batch, *zip(*args))
+
+
+def fuzz(fuzzer, cases=DEFAULT_CASES, seed=0, jobs=1, batch=BATCH):
+    """Run ``cases`` random cases in batches of ``batch``, on ``jobs`` processes.
+
+    Return a dict with the ``cases``, the ``seconds``, the ``rate`` (cases
+    per second), the ``engines`` seconds and the number of
+    ``disagreements``; for the first one ``reproducer`` is the minimal
+    case as an input file and ``answers`` the answers of the engines.
+    """
+    start = time.perf_counter()
+    timings = collections.OrderedDict()
+    failures = []
+    for batch_timings, batch_failures in _batches(fuzzer, cases, seed, jobs, batch):
+        for name, seconds in batch_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+        failures.extend(batch_failures)
+    seconds = time.perf_counter() - start
+    result = {"cases": cases, "seconds": seconds, "rate": cases / max(seconds, 1e-9), "engines": timings,
+              "disagreements": len(failures)}
+    if failures:
+        engines = load_engines(fuzzer)
+        case = shrink(fuzzer, engines, failures[0])
+        result.update(reproducer=fuzzer.format(case), answers=run_engines(engines, case))
+    return result
+
+
+def format_result(name, result):
+    lines = ["{:<20} {:7} cases {:8.2f}s {:9.0f} cases/s  {}".format(
+        name, result["cases"], result["seconds"], result["rate"],
+        "{} DISAGREEMENTS".format(result["disagreements"]) if result["disagreements"] else "ok"),
+        "    " + "  ".join("{} {:.2f}s".format(engine, s) for engine, s in result["engines"].items())]
+    if result["disagreements"]:
+        lines.append("    minimal case:")
+        lines.extend("        " + line for line in result["reproducer"].splitlines())
+        lines.extend("    {}: {}".format(engine, answer) for engine, answer in result["answers"].items())
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam.fuzz")
+    parser.add_argument("problems", nargs="*", metavar="problem",
+                        help="problems to fuzz, all if omitted: " + ", ".join(FUZZERS))
+    parser.add_argument("--cases", type=int, default=DEFAULT_CASES, help="random cases for every problem")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="run the cases on a pool of JOBS processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for name in args.problems:
+        if name not in FUZZERS:
+            parser.error("unknown problem " + name)
+    failed = False
+    for name in args.problems or list(FUZZERS):
+        result = fuzz(FUZZERS[name], args.cases, args.seed, args.jobs)
+        print(format_result(name, result))
+        failed = failed or result["disagreements"] > 0
+    return 1 if failed else 0
+
+
+def _broken_sum(values):
+    return sum(values) if max(values, default=0) < 7 else -1
+
+
+def _shrink_values(values):
+    for pos in range(len(values)):
+        yield _without(values, pos)
+    for pos, value in enumerate(values):
+        for smaller in smaller_ints(value):
+            yield _replaced(values, pos, smaller)
+
+
+_BROKEN = Fuzzer(None, lambda rnd: [rnd.randint(0, 20) for _ in range(rnd.randint(0, 6))],
+                 lambda solver: collections.OrderedDict([("sum", sum), ("broken", _broken_sum)]),
+                 _shrink_values, lambda values: "1\n{}\n".format(" ".join(map(str, values))))
+
+
+class Test(unittest.TestCase):
+    def test_smaller_ints(self):
+        self.assertEqual([0, 5, 7, 8], list(smaller_ints(9)))
+        self.assertEqual([0, -1], list(smaller_ints(-2)))
+        self.assertEqual([], list(smaller_ints(0)))
+
+    def test_engines_agree(self):
+        for name, fuzzer in FUZZERS.items():
+            result = fuzz(fuzzer, 60, seed=1, batch=25)
+            self.assertEqual(0, result["disagreements"], name)
+            self.assertEqual(60, result["cases"])
+            self.assertGreater(len(result["engines"]), 1)
+
+    def test_format(self):
+        for name, fuzzer in FUZZERS.items():
+            solver = load_solver(fuzzer.path)
+            case = fuzzer.generate(random.Random(name))
+            parsed = list(runner.get_test_cases(StringIO(fuzzer.format(case)), solver.parse_test_case))
+            self.assertEqual(1, len(parsed))
+            answers = run_engines(load_engines(fuzzer), case)
+            self.assertEqual(set(answers.values()) - {None}, {str(solver.do_single(parsed[0]))}, name)
+
+    def test_shrink(self):
+        for candidate in shrink_milkshakes(generate_milkshakes(random.Random(3))):
+            format_milkshakes(candidate)
+            n, customers = candidate
+            self.assertTrue(customers and all(customers))
+            self.assertTrue(all(1 <= f <= n for c in customers for f, _ in c))
+        result = fuzz(_BROKEN, 50)
+        self.assertGreater(result["disagreements"], 0)
+        self.assertEqual("1\n7\n", result["reproducer"])
+        self.assertEqual({"sum": 7, "broken": -1}, dict(result["answers"]))
+
+    def test_jobs(self):
+        serial = fuzz(FUZZERS["all_your_bases"], 40, batch=10)
+        parallel = fuzz(FUZZERS["all_your_bases"], 40, jobs=2, batch=10)
+        self.assertEqual(serial["engines"].keys(), parallel["engines"].keys())
+        self.assertEqual(0, parallel["disagreements"])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Output side of the runner.
+
+``BufferedWriter`` collects the ``Case #k: ...`` lines and writes them to
+the real output in chunks of ``buffer_size`` characters. A
+``FixtureComparator`` takes the place of the output file and checks every
+line against the expected ``.out`` file as soon as it is written, so a
+wrong answer stops the run at its case and nothing is kept in memory.
+"""
+import unittest
+from io import StringIO
+
+OUTPUT_BUFFER = 1 << 16
+CASE_PREFIX = "Case #"
+
+
+class BufferedWriter(object):
+    def __init__(self, f_out, buffer_size=OUTPUT_BUFFER):
+        self._f_out = f_out
+        self._buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._buffer_size:
+            self._write_parts()
+
+    def _write_parts(self):
+        if self._parts:
+            self._f_out.write("".join(self._parts))
+            self._parts = []
+            self._size = 0
+
+    def flush(self):
+        self._write_parts()
+        self._f_out.flush()
+
+
+class FixtureMismatch(AssertionError):
+    """The output differs from the fixture at case ``case``, line ``line`` (1 based).
+
+    The case is the number of ``Case #`` lines up to the different one, so
+    it is right for the results that span more lines too. ``output`` and
+    ``expected`` are the raw lines, line end included: ``output`` is
+    ``None`` when the output ended too early, ``expected`` when the
+    fixture did.
+    """
+
+    def __init__(self, case, line, output, expected):
+        self.case = case
+        self.line = line
+        self.output = output
+        self.expected = expected
+        # the line ends are shown only when they are the difference
+        shown = [line.rstrip("\n") if line is not None else None for line in (output, expected)]
+        if output is None or expected is None or shown[0] != shown[1]:
+            output, expected = shown
+        where = "case {} (line {})".format(case, line)
+        if expected is None:
+            message = "{}: {!r} not in the fixture".format(where, output)
+        elif output is None:
+            message = "{}: missing {!r}".format(where, expected)
+        else:
+            message = "{}: {!r} != {!r}".format(where, output, expected)
+        super(FixtureMismatch, self).__init__(message)
+
+
+class FixtureComparator(object):
+    """A file-like sink that compares what is written with ``f_expected``, line by line.
+
+    Raise ``FixtureMismatch`` at the first different line, line ends
+    included; ``close()`` (or the end of a ``with`` block) checks the last
+    line even without its newline and that no expected line is left.
+    """
+
+    def __init__(self, f_expected):
+        self._expected = f_expected
+        self._pending = ""
+        self.cases = 0
+        self.lines = 0
+
+    def write(self, text):
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._check(line + "\n")
+
+    def _check(self, line):
+        self.lines += 1
+        if line.startswith(CASE_PREFIX):
+            self.cases += 1
+        expected = self._expected.readline() or None
+        if line != expected:
+            raise FixtureMismatch(self.cases, self.lines, line, expected)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._pending:
+            self._check(self._pending)
+            self._pending = ""
+        expected = self._expected.readline()
+        if expected:
+            case = self.cases + expected.startswith(CASE_PREFIX)
+            raise FixtureMismatch(case, self.lines + 1, None, expected)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class Test(unittest.TestCase):
+    EXPECTED = "Case #1: 3\nCase #2: 1\nCase #3: 0\n"
+
+    def test_buffered_writer(self):
+        class Counter(StringIO):
+            writes = 0
+
+            def write(self, text):
+                self.writes += 1
+                return super(Counter, self).write(text)
+
+        so = Counter()
+        writer = BufferedWriter(so, 20)
+        for line in self.EXPECTED.splitlines(True):
+            writer.write(line)
+        self.assertEqual(1, so.writes)
+        writer.flush()
+        self.assertEqual(2, so.writes)
+        self.assertEqual(self.EXPECTED, so.getvalue())
+
+    def test_comparator(self):
+        with FixtureComparator(StringIO(self.EXPECTED)) as comparator:
+            comparator.write("Case #1: 3\nCase")
+            comparator.write(" #2: 1\n")
+            comparator.write("Case #3: 0\n")
+        self.assertEqual(3, comparator.cases)
+
+    def test_comparator_mismatch(self):
+        comparator = FixtureComparator(StringIO(self.EXPECTED))
+        comparator.write("Case #1: 3\n")
+        with self.assertRaises(FixtureMismatch) as cm:
+            comparator.write("Case #2: 2\nCase #3: 0\n")
+        self.assertEqual(2, cm.exception.case)
+        self.assertEqual("case 2 (line 2): 'Case #2: 2' != 'Case #2: 1'", str(cm.exception))
+
+    def test_comparator_length(self):
+        with self.assertRaises(FixtureMismatch) as cm:
+            with FixtureComparator(StringIO(self.EXPECTED)) as comparator:
+                comparator.write("Case #1: 3\nCase #2: 1\n")
+        self.assertEqual("case 3 (line 3): missing 'Case #3: 0'", str(cm.exception))
+        comparator = FixtureComparator(StringIO(self.EXPECTED))
+        comparator.write(self.EXPECTED)
+        with self.assertRaises(FixtureMismatch) as cm:
+            comparator.write("Case #4: 1\n")
+        self.assertEqual("case 4 (line 4): 'Case #4: 1' not in the fixture", str(cm.exception))
+
+    def test_comparator_multiline_cases(self):
+        expected = "Case #1:\n1 2\n3 4\nCase #2:\n5 6\n"
+        with self.assertRaises(FixtureMismatch) as cm:
+            with FixtureComparator(StringIO(expected)) as comparator:
+                comparator.write("Case #1:\n1 2\n3 4\nCase #2:\n5 7\n")
+        self.assertEqual((2, 5), (cm.exception.case, cm.exception.line))
+        self.assertEqual("case 2 (line 5): '5 7' != '5 6'", str(cm.exception))
+        with self.assertRaises(FixtureMismatch) as cm:
+            with FixtureComparator(StringIO(expected)) as comparator:
+                comparator.write("Case #1:\n1 2\n")
+        self.assertEqual((1, 3), (cm.exception.case, cm.exception.line))
+        with self.assertRaises(FixtureMismatch) as cm:
+            with FixtureComparator(StringIO(expected)) as comparator:
+                comparator.write("Case #1:\n1 2\n3 4\n")
+        self.assertEqual((2, 4), (cm.exception.case, cm.exception.line))
+
+    def test_comparator_line_ends(self):
+        with self.assertRaises(FixtureMismatch) as cm:
+            with FixtureComparator(StringIO(self.EXPECTED)) as comparator:
+                comparator.write(self.EXPECTED.rstrip("\n"))
+        self.assertEqual("case 3 (line 3): 'Case #3: 0' != 'Case #3: 0\\n'", str(cm.exception))
+        comparator = FixtureComparator(StringIO(self.EXPECTED.replace("\n", "\r\n")))
+        with self.assertRaises(FixtureMismatch) as cm:
+            comparator.write(self.EXPECTED)
+        self.assertEqual(1, cm.exception.case)
+        with FixtureComparator(StringIO(self.EXPECTED.replace("\n", "\r\n"))) as comparator:
+            comparator.write(self.EXPECTED.replace("\n", "\r\n"))
+        with self.assertRaises(FixtureMismatch):
+            with FixtureComparator(StringIO(self.EXPECTED.rstrip("\n"))) as comparator:
+                comparator.write(self.EXPECTED)
@@ -0,0 +1,124 @@
+"""Overlap reading, solving and writing the cases.
+
+Three asyncio stages linked by queues of ``queue_size`` items: the cases
+are parsed in a reader thread, solved in an executor (a thread, or a
+pool of ``jobs`` processes) and written in order by a writer thread. A
+full queue stops the stage before it, so at most about ``2 * queue_size``
+cases are between the reader and the writer whatever the input size.
+"""
+import asyncio
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PIPELINE_QUEUE = 8
+
+_END = object()
+
+
+async def _run(test_cases, do_single, write, jobs, queue_size):
+    loop = asyncio.get_running_loop()
+    parsed = asyncio.Queue(queue_size)
+    solving = asyncio.Queue(queue_size)
+    solver_pool = ProcessPoolExecutor(jobs) if jobs > 1 else ThreadPoolExecutor(1)
+    with ThreadPoolExecutor(1) as reader, ThreadPoolExecutor(1) as writer, solver_pool:
+        async def read():
+            cases = iter(test_cases)
+            while True:
+                case = await loop.run_in_executor(reader, next, cases, _END)
+                await parsed.put(case)
+                if case is _END:
+                    return
+
+        async def solve():
+            while True:
+                case = await parsed.get()
+                if case is _END:
+                    await solving.put(_END)
+                    return
+                await solving.put(loop.run_in_executor(solver_pool, do_single, case))
+
+        async def write_all():
+            pos = 0
+            while True:
+                future = await solving.get()
+                if future is _END:
+                    return
+                result = await future
+                pos += 1
+                await loop.run_in_executor(writer, write, pos, result)
+
+        tasks = [asyncio.ensure_future(stage()) for stage in (read, solve, write_all)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            while not solving.empty():
+                future = solving.get_nowait()
+                if future is not _END:
+                    future.cancel()
+
+
+def pipeline(test_cases, do_single, write, jobs=1, queue_size=PIPELINE_QUEUE):
+    """Call ``write(pos, do_single(case))`` for every case of ``test_cases``, in order.
+
+    ``test_cases`` is consumed (so the cases are parsed) in the reader
+    thread and ``write`` is called in the writer thread; with ``jobs > 1``
+    ``do_single`` and the cases must be picklable.
+    """
+    asyncio.run(_run(test_cases, do_single, write, jobs, queue_size))
+
+
+def _negate(value):
+    return -value
+
+
+class Test(unittest.TestCase):
+    def test_order(self):
+        written = []
+
+        def slow(value):
+            time.sleep(0.001 * (value % 3))
+            return value * value
+
+        pipeline(range(50), slow, lambda pos, result: written.append((pos, result)), queue_size=2)
+        self.assertEqual([(pos + 1, pos * pos) for pos in range(50)], written)
+
+    def test_jobs(self):
+        written = []
+        pipeline(range(20), _negate, lambda pos, result: written.append(result), jobs=2, queue_size=3)
+        self.assertEqual([-v for v in range(20)], written)
+
+    def test_backpressure(self):
+        events = {"read": 0, "lead": 0}
+
+        def cases():
+            for value in range(100):
+                events["read"] += 1
+                yield value
+
+        def write(pos, result):
+            events["lead"] = max(events["lead"], events["read"] - pos)
+            time.sleep(0.0005)
+
+        pipeline(cases(), abs, write, queue_size=2)
+        self.assertLessEqual(events["lead"], 2 * 2 + 3)
+
+    def test_errors(self):
+        def fail(value):
+            if value == 5:
+                raise ValueError("bad case")
+            return value
+
+        written = []
+        with self.assertRaises(ValueError):
+            pipeline(range(100), fail, lambda pos, result: written.append(result), queue_size=2)
+        self.assertEqual(list(range(5)), written)
+
+        def bad_cases():
+            yield 1
+            raise EOFError("No more tokens")
+
+        with self.assertRaises(EOFError):
+            pipeline(bad_cases(), abs, lambda pos, result: None)
@@ -0,0 +1,443 @@
+"""Shared driver for the solutions.
+
+Every solution module exposes ``parse_test_case(tokens)`` and
+``do_single(case)``: the functions here read the cases, run them and
+write the ``Case #k: ...`` lines. ``tokens`` is a ``codejam.tokens.Tokens``
+over the input file.
+"""
+import argparse
+import collections
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from codejam.cache import CachedSolver, CaseHash, ResultCache, DEFAULT_DIRECTORY, DEFAULT_MAX_BYTES
+from codejam.output import BufferedWriter, FixtureComparator, FixtureMismatch, OUTPUT_BUFFER
+from codejam.pipeline import PIPELINE_QUEUE, pipeline
+from codejam.stats import CaseStats, MEMORY_SITES, SLOWEST, format_record, format_summary, solver_name
+from codejam.tokens import tokenize
+
+FILE_TEMPLATE = "{}-{}-practice.{}"
+PENDING_PER_JOB = 4
+
+
+# noinspection PyUnusedLocal
+def none_log(text):
+    pass
+
+
+def stderr_log(text):
+    """Log to stderr, so the ``Case #k: ...`` lines are the only ones on stdout."""
+    sys.stderr.write(text + "\n")
+
+
+def read_tests_number(tokens):
+    return int(tokens.readline())
+
+
+def iter_test_cases(tokens, parse_test_case, tests):
+    """Parse the cases lazily: a case is read only when it is requested."""
+    for _ in range(tests):
+        yield parse_test_case(tokens)
+
+
+def iter_keyed_test_cases(tokens, parse_test_case, tests):
+    """Like ``iter_test_cases`` but yield ``(key, case)``: ``key`` is the ``codejam.cache.case_key``.
+
+    The case input text is hashed while it is parsed, it is not kept.
+    """
+    for _ in range(tests):
+        tokens.hash_from(CaseHash())
+        case = parse_test_case(tokens)
+        yield tokens.hash_end().hexdigest(), case
+
+
+def get_test_cases(f_in, parse_test_case):
+    tokens = tokenize(f_in)
+    return iter_test_cases(tokens, parse_test_case, read_tests_number(tokens))
+
+
+def write_case_result(f_out, pos, result):
+    f_out.write("Case #{}: ".format(pos) + str(result) + "\n")
+
+
+def dump_case_result(case, f_out, pos, do_single):
+    write_case_result(f_out, pos, do_single(case))
+
+
+def solve_cases(test_cases, do_single, jobs=1):
+    """Yield the results of ``do_single`` in case order.
+
+    ``test_cases`` can be any iterable and is consumed lazily. With
+    ``jobs > 1`` the cases are sent to a pool of ``jobs`` processes
+    (``do_single`` and the cases must be picklable) and at most
+    ``PENDING_PER_JOB * jobs`` of them are in flight at the same time.
+    """
+    if jobs <= 1:
+        for case in test_cases:
+            yield do_single(case)
+        return
+    pending = collections.deque()
+    with ProcessPoolExecutor(jobs) as pool:
+        for case in test_cases:
+            pending.append(pool.submit(do_single, case))
+            if len(pending) >= PENDING_PER_JOB * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def do(f_in, f_out, parse_test_case, do_single, log=none_log, jobs=1, flush_every=0, cache=None, stats=None,
+       buffer_size=OUTPUT_BUFFER, queue_size=None):
+    """Read, solve and write one case at a time.
+
+    The results are written to ``f_out`` in chunks of ``buffer_size``
+    characters; a ``flush_every`` greater than 0 flushes them every
+    ``flush_every`` cases too. A ``FixtureComparator`` is not buffered, so
+    it stops the run at the first wrong case. With a
+    ``codejam.cache.ResultCache`` the cases already solved by the same
+    solution version are not solved again. The stage timings of every case
+    are collected in ``stats`` (a new ``codejam.stats.CaseStats`` if not
+    given) and logged; when ``stats`` measures the memory too,
+    ``tracemalloc`` traces the run.
+
+    With a ``queue_size`` the cases are parsed, solved and written by the
+    overlapped stages of ``codejam.pipeline``: the output is the same.
+    """
+    tokens = tokenize(f_in)
+    l = read_tests_number(tokens)
+    if not isinstance(f_out, FixtureComparator):
+        f_out = BufferedWriter(f_out, buffer_size)
+    stats = CaseStats() if stats is None else stats
+    parse_test_case = stats.parser(parse_test_case, tokens)
+    if cache is None:
+        test_cases = iter_test_cases(tokens, parse_test_case, l)
+    else:
+        test_cases = iter_keyed_test_cases(tokens, parse_test_case, l)
+        do_single = CachedSolver(do_single, cache)
+    log("=" * 20 + " START " + "=" * 20)
+    tracing = stats.memory is not None and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    def write(pos, timed_result):
+        measures, result = timed_result
+        start = time.perf_counter()
+        write_case_result(f_out, pos, result)
+        if flush_every and not pos % flush_every:
+            f_out.flush()
+        record = stats.solved(pos, measures, time.perf_counter() - start)
+        log("#" * 10 + "{}/{}  ".format(pos, l) + format_record(record))
+
+    try:
+        if queue_size:
+            pipeline(test_cases, stats.timed(do_single), write, jobs, queue_size)
+        else:
+            for pos, timed_result in enumerate(solve_cases(test_cases, stats.timed(do_single), jobs), 1):
+                write(pos, timed_result)
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    f_out.flush()
+    if cache is not None:
+        cache.evict()
+    log(format_summary(stats.summary()))
+    log("=" * 20 + "  END  " + "=" * 20)
+
+
+def file_name(direction, dimension="small", nr="A"):
+    if direction not in ["in", "out"]:
+        raise ValueError()
+    return FILE_TEMPLATE.format(nr, dimension, direction)
+
+
+def default_files(dimension, use_stdout, nr="A"):
+    f_in_name = file_name("in", dimension, nr)
+    f_out_name = file_name("out", dimension, nr)
+    fin = open(f_in_name)
+    if use_stdout:
+        return fin, sys.stdout
+    return fin, open(f_out_name, "w")
+
+
+def arg_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        usage="%(prog)s [options] <input_file> [output_file]\n"
+              "       %(prog)s [options] small|large [-]")
+    parser.add_argument("source", help="input file or small|large to use the practice files")
+    parser.add_argument("dest", nargs="?",
+                        help="output file (stdout if omitted); '-' means stdout with small|large")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="solve the cases with a pool of JOBS processes")
+    parser.add_argument("--flush-every", type=int, default=0, metavar="N",
+                        help="flush the output every N cases too (default: only when the buffer is full)")
+    parser.add_argument("--buffer-size", type=int, default=OUTPUT_BUFFER, metavar="CHARS",
+                        help="write the output in chunks of CHARS characters")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_DIRECTORY, metavar="DIR",
+                        help="reuse the results of the cases already solved (default: %(const)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar="MB",
+                        help="evict the least recently used results above this size")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="write the timings and sizes of every case to FILE as JSON lines")
+    parser.add_argument("--slowest", type=int, default=SLOWEST, metavar="N",
+                        help="number of slowest cases in the summary")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DIR",
+                        help="profile the solve stage and dump the stats to DIR/<solution>.prof")
+    parser.add_argument("--memory", nargs="?", type=int, const=MEMORY_SITES, metavar="SITES",
+                        help="measure the traced memory of every case and stage, with SITES allocation sites")
+    parser.add_argument("--pipeline", nargs="?", type=int, const=PIPELINE_QUEUE, metavar="QUEUE",
+                        help="read, solve and write the cases at the same time, with at most QUEUE cases "
+                             "waiting between two stages (default: %(const)s)")
+    return parser
+
+
+def open_files(args, nr):
+    if args.source in ["small", "large"]:
+        return default_files(args.source, args.dest == "-", nr)
+    src, dst = open(args.source), sys.stdout
+    if args.dest is not None:
+        dst = open(args.dest, "w")
+    return src, dst
+
+
+def main(parse_test_case, do_single, nr, argv=None, metrics=None):
+    run(arg_parser().parse_args(argv), parse_test_case, do_single, nr, metrics)
+
+
+def run(args, parse_test_case, do_single, nr, metrics=None):
+    """Solve with the options parsed by ``arg_parser()`` (or an extension of it).
+
+    ``metrics(case)`` gives the size metrics of a case for the stats.
+    """
+    if args.profile and args.jobs > 1:
+        raise SystemExit("--profile needs a single job")
+    if args.pipeline and args.memory is not None:
+        raise SystemExit("--memory can't measure the overlapped stages of --pipeline")
+    src, dst = open_files(args, nr)
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, args.cache_size * 1024 * 1024)
+    f_json = open(args.stats, "w") if args.stats else None
+    stats = CaseStats(metrics, f_json, args.profile is not None, args.slowest, args.memory)
+    do(src, dst, parse_test_case, do_single, stderr_log, args.jobs, args.flush_every, cache, stats, args.buffer_size,
+       args.pipeline)
+    if f_json is not None:
+        f_json.write(json.dumps({"summary": stats.summary()}, sort_keys=True) + "\n")
+        f_json.close()
+    if args.profile:
+        stderr_log("Profile: " + stats.dump_profile(args.profile, solver_name(do_single)))
+        stats.profile_stats(sys.stderr).sort_stats("cumulative").print_stats(15)
+
+
+def _parse_number(tokens):
+    return tokens.int()
+
+
+def _parse_number_line(f_in):
+    return int(f_in.readline())
+
+
+def _records(f_json):
+    """The records written by ``CaseStats``, with the two lines of every case merged."""
+    records = collections.OrderedDict()
+    for line in f_json.getvalue().splitlines():
+        record = json.loads(line)
+        records.setdefault(record["case"], {}).update(record)
+    return sorted(records.values(), key=lambda r: r["case"])
+
+
+class Test(unittest.TestCase):
+    INPUT = "4\n3\n-1\n0\n-7\n"
+    OUTPUT = "Case #1: 3\nCase #2: 1\nCase #3: 0\nCase #4: 7\n"
+
+    def test_get_test_cases(self):
+        self.assertEqual([3, -1, 0, -7], list(get_test_cases(StringIO(self.INPUT), _parse_number)))
+
+    def test_line_parser(self):
+        so = StringIO()
+        do(StringIO(self.INPUT), so, _parse_number_line, abs)
+        self.assertEqual(self.OUTPUT, so.getvalue())
+
+    def test_streaming(self):
+        events = []
+
+        def parse(f_in):
+            events.append("parse")
+            return _parse_number(f_in)
+
+        def solve(case):
+            events.append("solve")
+            return case
+
+        do(StringIO(self.INPUT), StringIO(), parse, solve)
+        self.assertEqual(["parse", "solve"] * 4, events)
+
+    def test_flush_every(self):
+        class FlushCounter(StringIO):
+            flushes = 0
+
+            def flush(self):
+                self.flushes += 1
+
+        so = FlushCounter()
+        do(StringIO(self.INPUT), so, _parse_number, abs)
+        self.assertEqual(1, so.flushes)
+        for flush_every, flushes in [(1, 5), (2, 3), (3, 2), (0, 1)]:
+            so = FlushCounter()
+            do(StringIO(self.INPUT), so, _parse_number, abs, flush_every=flush_every)
+            self.assertEqual(flushes, so.flushes)
+            self.assertEqual(self.OUTPUT, so.getvalue())
+
+    def test_do(self):
+        so = StringIO()
+        do(StringIO(self.INPUT), so, _parse_number, abs)
+        self.assertEqual(self.OUTPUT, so.getvalue())
+
+    def test_do_jobs(self):
+        data = "".join("{}\n".format(i - 50) for i in range(100))
+        serial, parallel = StringIO(), StringIO()
+        do(StringIO("100\n" + data), serial, _parse_number, abs)
+        do(StringIO("100\n" + data), parallel, _parse_number, abs, jobs=3)
+        self.assertEqual(serial.getvalue(), parallel.getvalue())
+
+    def test_pipeline(self):
+        data = "".join("{}\n".format(i - 50) for i in range(100))
+        serial = StringIO()
+        do(StringIO("100\n" + data), serial, _parse_number, abs)
+        for jobs, queue_size in [(1, 1), (1, 8), (3, 2)]:
+            so, f_json = StringIO(), StringIO()
+            do(StringIO("100\n" + data), so, _parse_number, abs, jobs=jobs, stats=CaseStats(f_json=f_json),
+               queue_size=queue_size)
+            self.assertEqual(serial.getvalue(), so.getvalue())
+            self.assertEqual(list(range(1, 101)), [r["case"] for r in _records(f_json)])
+        with self.assertRaises(FixtureMismatch) as cm:
+            do(StringIO(self.INPUT), FixtureComparator(StringIO(self.OUTPUT)), _parse_number, lambda case: case,
+               queue_size=2)
+        self.assertEqual(2, cm.exception.case)
+
+    def test_cache(self):
+        calls = []
+
+        def solve(case):
+            calls.append(case)
+            return abs(case)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(tmp)
+            for _ in range(2):
+                so = StringIO()
+                do(StringIO(self.INPUT), so, _parse_number, solve, cache=cache)
+                self.assertEqual(self.OUTPUT, so.getvalue())
+            self.assertEqual([3, -1, 0, -7], calls)
+            so = StringIO()
+            do(StringIO("2\n3\n5\n"), so, _parse_number, solve, cache=cache)
+            self.assertEqual("Case #1: 3\nCase #2: 5\n", so.getvalue())
+            self.assertEqual([3, -1, 0, -7, 5], calls)
+
+    def test_cache_jobs(self):
+        data = "".join("{}\n".format(i - 50) for i in range(100))
+        serial = StringIO()
+        do(StringIO("100\n" + data), serial, _parse_number, abs)
+        with tempfile.TemporaryDirectory() as tmp:
+            for _ in range(2):
+                parallel = StringIO()
+                do(StringIO("100\n" + data), parallel, _parse_number, abs, jobs=3, cache=ResultCache(tmp))
+                self.assertEqual(serial.getvalue(), parallel.getvalue())
+
+    def test_buffer_size(self):
+        class WriteCounter(StringIO):
+            writes = 0
+
+            def write(self, text):
+                self.writes += 1
+                return super(WriteCounter, self).write(text)
+
+        for buffer_size, writes in [(1, 4), (20, 2), (1000, 1)]:
+            so = WriteCounter()
+            do(StringIO(self.INPUT), so, _parse_number, abs, buffer_size=buffer_size)
+            self.assertEqual(writes, so.writes)
+            self.assertEqual(self.OUTPUT, so.getvalue())
+
+    def test_fixture_comparator(self):
+        with FixtureComparator(StringIO(self.OUTPUT)) as comparator:
+            do(StringIO(self.INPUT), comparator, _parse_number, abs)
+        events = []
+
+        def solve(case):
+            events.append(case)
+            return case
+
+        with self.assertRaises(FixtureMismatch) as cm:
+            do(StringIO(self.INPUT), FixtureComparator(StringIO(self.OUTPUT)), _parse_number, solve)
+        self.assertEqual(2, cm.exception.case)
+        self.assertEqual([3, -1], events)
+
+    def test_stats(self):
+        f_json = StringIO()
+        stats = CaseStats(lambda case: {"value": case}, f_json)
+        logs = []
+        do(StringIO(self.INPUT), StringIO(), _parse_number, abs, logs.append, stats=stats)
+        records = _records(f_json)
+        self.assertEqual([1, 2, 3, 4], [r["case"] for r in records])
+        self.assertEqual([3, -1, 0, -7], [r["value"] for r in records])
+        self.assertTrue(all(r["total"] >= r["solve"] >= 0 for r in records))
+        self.assertIn("p95", logs[-2])
+
+    def test_memory(self):
+        f_json = StringIO()
+        do(StringIO(self.INPUT), StringIO(), _parse_number, lambda case: " ".join(["x"] * 1000)[:1],
+           stats=CaseStats(f_json=f_json, memory=1))
+        self.assertFalse(tracemalloc.is_tracing())
+        records = _records(f_json)
+        self.assertTrue(all(r["solve_peak"] > 1000 for r in records))
+        self.assertEqual(1, len(records[0]["solve_sites"]))
+        f_json = StringIO()
+        do(StringIO(self.INPUT), StringIO(), _parse_number, abs, jobs=2, stats=CaseStats(f_json=f_json, memory=0))
+        self.assertEqual(4, len([r for r in _records(f_json) if "solve_peak" in r]))
+
+    def test_run_stats(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            f_in_name = os.path.join(tmp, "input.in")
+            with open(f_in_name, "w") as f_in:
+                f_in.write(self.INPUT)
+            f_json_name = os.path.join(tmp, "stats.json")
+            args = arg_parser().parse_args([f_in_name, os.path.join(tmp, "output.out"), "--stats", f_json_name,
+                                            "--profile", tmp])
+            with contextlib.redirect_stderr(StringIO()) as err:
+                run(args, _parse_number, abs, "A")
+            self.assertIn("Profile: ", err.getvalue())
+            with open(f_json_name) as f_json:
+                lines = [json.loads(line) for line in f_json]
+            self.assertEqual([1, 1, 2, 2, 3, 3, 4, 4], [r["case"] for r in lines[:-1]])
+            self.assertEqual(4, lines[-1]["summary"]["cases"])
+            self.assertTrue(os.path.isfile(os.path.join(tmp, "solver.prof")))
+
+    def test_run_stdout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            f_in_name = os.path.join(tmp, "input.in")
+            with open(f_in_name, "w") as f_in:
+                f_in.write(self.INPUT)
+            with contextlib.redirect_stdout(StringIO()) as out, contextlib.redirect_stderr(StringIO()) as err:
+                run(arg_parser().parse_args([f_in_name]), _parse_number, abs, "A")
+            self.assertEqual(self.OUTPUT, out.getvalue())
+            self.assertIn(" START ", err.getvalue())
+
+    def test_file_name(self):
+        self.assertEqual("B-large-practice.out", file_name("out", "large", "B"))
+        with self.assertRaises(ValueError):
+            file_name("err")
+
+    def test_open_files(self):
+        args = arg_parser().parse_args(["-j", "4", os.devnull])
+        src, dst = open_files(args, "A")
+        src.close()
+        self.assertEqual(4, args.jobs)
+        self.assertIs(sys.stdout, dst)
@@ -0,0 +1,45 @@
+"""Load the solution modules from their ``YYYY_RoundXX`` folders."""
+import importlib.util
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def module_name(path):
+    """Unique module name for a solution: ``<round>_<file name>``."""
+    path = os.path.abspath(path)
+    round_dir = os.path.basename(os.path.dirname(path))
+    return "{}_{}".format(round_dir, os.path.splitext(os.path.basename(path))[0])
+
+
+def load_solver(path):
+    """Import the solution in ``path`` (relative to the repository root if not absolute).
+
+    The module is registered in ``sys.modules`` so that its functions can
+    be pickled and sent to a process pool.
+    """
+    path = os.path.join(ROOT, path)
+    name = module_name(path)
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+class Test(unittest.TestCase):
+    def test_module_name(self):
+        self.assertEqual("2008_Round1A_b_milkshakes", module_name("2008_Round1A/b_milkshakes.py"))
+
+    def test_load_solver(self):
+        module = load_solver("2009_Round1C/a_all_your_bases.py")
+        self.assertEqual(75, module.solve("cats"))
+        self.assertIs(module, load_solver(os.path.join(ROOT, "2009_Round1C", "a_all_your_bases.py")))
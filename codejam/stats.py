@@ -0,0 +1,400 @@
+"""Per case timings of the runner.
+
+Every case gets a record with the seconds spent parsing, solving and
+writing it (``perf_counter``), the bytes of input it took and the size
+metrics returned by the solution ``case_metrics(case)``. The records can
+be written as JSON lines: the parse part of a case before solving it,
+so it is there even if the solve kills the process, and then the rest.
+Only the records of the cases in flight are kept, the run is summarized
+by streaming histograms (for the percentiles) and by the slowest cases.
+The solve stage can also run under
+``cProfile``, and with ``memory`` the records get the ``tracemalloc``
+peak and net allocation of the parse and solve stages and their top
+allocation sites.
+"""
+import cProfile
+import collections
+import heapq
+import json
+import math
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from io import StringIO
+
+from codejam.solvers import module_name
+
+STAGES = ("parse", "solve", "output")
+MEMORY_STAGES = ("parse", "solve")
+SLOWEST = 5
+MEMORY_SITES = 3
+HISTOGRAM_RATIO = 1.01
+
+
+def solver_name(do_single):
+    """``<round>_<file name>`` of the solution that defines ``do_single``."""
+    module = sys.modules.get(getattr(do_single, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    return module_name(path) if path else "solver"
+
+
+class Histogram(object):
+    """Streaming distribution of non negative values, in buckets of growing size.
+
+    The bucket of a value is its logarithm in base ``ratio``: the memory
+    grows with the range of the values and not with their number, and
+    the percentiles are within a factor ``ratio`` of the exact ones.
+    """
+
+    def __init__(self, ratio=HISTOGRAM_RATIO):
+        self._log_ratio = math.log(ratio)
+        self._buckets = collections.Counter()
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self._buckets[math.floor(math.log(value) / self._log_ratio) if value > 0 else -math.inf] += 1
+
+    def percentile(self, p):
+        """Nearest rank percentile (``p`` in [0, 100]): the upper bound of its bucket, at most ``max``."""
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(math.exp((bucket + 1) * self._log_ratio), self.max)
+        return 0
+
+
+class MemoryProbe(object):
+    """Traced memory of a stage: ``tracemalloc`` must be tracing.
+
+    The peak and the net allocation are relative to the start of the
+    stage; with ``sites`` the stage is also compared with a snapshot taken
+    at its start, to give the source lines that allocated the most.
+    """
+
+    def __init__(self, sites=MEMORY_SITES):
+        self.sites = sites
+        self._before = 0
+        self._snapshot = None
+
+    def start(self):
+        if self.sites:
+            self._snapshot = _take_snapshot()
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.get_traced_memory()[0]
+
+    def stop(self, stage):
+        current, peak = tracemalloc.get_traced_memory()
+        measures = {stage + "_peak": peak - self._before, stage + "_net": current - self._before}
+        if self._snapshot is not None:
+            stats = _take_snapshot().compare_to(self._snapshot, "lineno")
+            measures[stage + "_sites"] = ["{}:{} {:+d}B".format(s.traceback[0].filename, s.traceback[0].lineno,
+                                                                s.size_diff) for s in stats[:self.sites]]
+            self._snapshot = None
+        return measures
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+class TimedSolver(object):
+    """Wrap ``do_single`` to return ``(measures, result)``; optionally under ``cProfile``.
+
+    ``measures`` has the ``solve`` seconds and, with ``memory`` (the
+    number of allocation sites to keep), the solve memory measures.
+    """
+
+    def __init__(self, do_single, profile=False, memory=None):
+        self.do_single = do_single
+        self.profiler = cProfile.Profile() if profile else None
+        self.memory = memory
+
+    def __call__(self, case):
+        probe = None
+        if self.memory is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            probe = MemoryProbe(self.memory)
+            probe.start()
+        start = time.perf_counter()
+        if self.profiler is None:
+            result = self.do_single(case)
+        else:
+            result = self.profiler.runcall(self.do_single, case)
+        measures = {"solve": time.perf_counter() - start}
+        if probe is not None:
+            measures.update(probe.stop("solve"))
+        return measures, result
+
+
+class CaseStats(object):
+    """Collect the case records of a run.
+
+    ``metrics(case)`` returns a dict of size metrics for a parsed case.
+    With ``f_json`` every case is written as two JSON lines with its
+    ``case`` number: the parse measures and metrics (flushed before the
+    case is solved), then the solve and output measures and the ``total``.
+    ``memory`` turns on the memory measures, keeping that many allocation
+    sites per stage.
+    """
+
+    def __init__(self, metrics=None, f_json=None, profile=False, slowest=SLOWEST, memory=None):
+        self.metrics = metrics
+        self.f_json = f_json
+        self.profile = profile
+        self.slowest = slowest
+        self.memory = memory
+        self.solver = None
+        self.parsed = 0
+        self._pending = {}
+        self._stages = {stage: Histogram() for stage in STAGES + ("total",)}
+        self._memory = {stage: Histogram() for stage in MEMORY_STAGES}
+        self._slowest = []
+        self._worst = []
+        self._lock = threading.Lock()
+
+    def parser(self, parse_test_case, tokens):
+        """Wrap ``parse_test_case`` to record parse time and input bytes of every case."""
+        def parse(tokens_):
+            probe = None
+            if self.memory is not None:
+                probe = MemoryProbe(self.memory)
+                probe.start()
+            start, position = time.perf_counter(), tokens.position
+            case = parse_test_case(tokens_)
+            record = {"case": self.parsed + 1, "parse": time.perf_counter() - start,
+                      "bytes": tokens.position - position}
+            if probe is not None:
+                record.update(probe.stop("parse"))
+            if self.metrics is not None:
+                record.update(self.metrics(case))
+            self._pending[record["case"]] = record
+            self.parsed += 1
+            self._write(record, True)
+            return case
+        return parse
+
+    def timed(self, do_single):
+        self.solver = TimedSolver(do_single, self.profile, self.memory)
+        return self.solver
+
+    def solved(self, pos, measures, output):
+        """Complete the record of case ``pos`` (1 based) with the solve ``measures`` and return it."""
+        record = self._pending.pop(pos)
+        record.update(measures, output=output)
+        record["total"] = sum(record[s] for s in STAGES)
+        self._write(dict(measures, case=pos, output=output, total=record["total"]))
+        for stage, histogram in self._stages.items():
+            histogram.add(record[stage])
+        self._keep(self._slowest, record["total"], record)
+        if self.memory is not None:
+            for stage, histogram in self._memory.items():
+                histogram.add(record[stage + "_peak"])
+            self._keep(self._worst, _peak(record), record)
+        return record
+
+    def _write(self, record, flush=False):
+        if self.f_json is not None:
+            with self._lock:
+                self.f_json.write(json.dumps(record, sort_keys=True) + "\n")
+                if flush:
+                    self.f_json.flush()
+
+    def _keep(self, heap, key, record):
+        """Keep the ``slowest`` records with the largest ``key`` in ``heap``."""
+        heapq.heappush(heap, (key, record["case"], record))
+        if len(heap) > self.slowest:
+            heapq.heappop(heap)
+
+    def summary(self, slowest=None):
+        slowest = self.slowest if slowest is None else slowest
+        result = {"cases": self._stages["total"].count}
+        for stage in STAGES + ("total",):
+            h = self._stages[stage]
+            result[stage] = {"sum": h.sum, "p50": h.percentile(50), "p95": h.percentile(95), "max": h.max}
+        result["slowest"] = [r for _, _, r in sorted(self._slowest, reverse=True)][:slowest]
+        if self.memory is not None:
+            result["memory"] = memory = {}
+            for stage in MEMORY_STAGES:
+                h = self._memory[stage]
+                memory[stage] = {"p50": h.percentile(50), "p95": h.percentile(95), "max": h.max}
+            memory["worst"] = [r for _, _, r in sorted(self._worst, reverse=True)][:slowest]
+        return result
+
+    def profile_stats(self, stream=None):
+        """The ``pstats.Stats`` of the solve stage, ``None`` if not profiled."""
+        if self.solver is None or self.solver.profiler is None:
+            return None
+        return pstats.Stats(self.solver.profiler, stream=stream or StringIO())
+
+    def dump_profile(self, directory, name):
+        """Write the solve stage profile to ``directory/name.prof`` and return the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + ".prof")
+        self.profile_stats().dump_stats(path)
+        return path
+
+
+def _peak(record):
+    return max(record[stage + "_peak"] for stage in MEMORY_STAGES)
+
+
+def format_record(record):
+    metrics = " ".join("{}={}".format(k, v) for k, v in sorted(record.items())
+                       if k not in STAGES + ("case", "total") and not k.endswith("_sites"))
+    return "parse {:.6f}s solve {:.6f}s output {:.6f}s  {}".format(
+        record["parse"], record["solve"], record["output"], metrics).rstrip()
+
+
+def format_summary(summary):
+    lines = ["{} cases".format(summary["cases"])]
+    for stage in STAGES + ("total",):
+        s = summary[stage]
+        lines.append("{:<6} sum {:.6f}s  p50 {:.6f}s  p95 {:.6f}s  max {:.6f}s".format(
+            stage, s["sum"], s["p50"], s["p95"], s["max"]))
+    lines.append("slowest:")
+    lines.extend("  case {:>4}: ".format(r["case"]) + format_record(r) for r in summary["slowest"])
+    if "memory" in summary:
+        for stage in MEMORY_STAGES:
+            m = summary["memory"][stage]
+            lines.append("{:<6} peak p50 {:.0f}B  p95 {:.0f}B  max {}B".format(stage, m["p50"], m["p95"], m["max"]))
+        lines.append("largest peaks:")
+        for r in summary["memory"]["worst"]:
+            lines.append("  case {:>4}: parse peak {}B net {}B, solve peak {}B net {}B".format(
+                r["case"], r["parse_peak"], r["parse_net"], r["solve_peak"], r["solve_net"]))
+            lines.extend("    {:<5} {}".format(stage, site)
+                         for stage in MEMORY_STAGES for site in r.get(stage + "_sites", []))
+    return "\n".join(lines)
+
+
+def _square(value):
+    return value * value
+
+
+class Test(unittest.TestCase):
+    def test_histogram(self):
+        h = Histogram()
+        for value in range(1, 101):
+            h.add(value)
+        self.assertEqual((100, 5050, 100), (h.count, h.sum, h.max))
+        self.assertAlmostEqual(50, h.percentile(50), delta=50 * (HISTOGRAM_RATIO - 1))
+        self.assertAlmostEqual(95, h.percentile(95), delta=95 * (HISTOGRAM_RATIO - 1))
+        self.assertEqual(100, h.percentile(100))
+        self.assertEqual(0, Histogram().percentile(50))
+        h = Histogram()
+        for value in [0, 0, 0, 7]:
+            h.add(value)
+        self.assertEqual(0, h.percentile(50))
+        self.assertEqual(7, h.percentile(95))
+        self.assertLess(len(h._buckets), 3)
+
+    def test_records(self):
+        from codejam.tokens import tokenize
+        tokens = tokenize(StringIO("3 1 22 333"))
+        f_json = StringIO()
+        stats = CaseStats(lambda case: {"digits": len(str(case))}, f_json)
+        parse = stats.parser(lambda t: t.int(), tokens)
+        solver = stats.timed(_square)
+        for pos in range(1, 4):
+            measures, result = solver(parse(tokens))
+            stats.solved(pos, measures, 0.0)
+        lines = [json.loads(line) for line in f_json.getvalue().splitlines()]
+        parsed, solved = lines[0::2], lines[1::2]
+        self.assertEqual([1, 2, 3], [r["case"] for r in parsed])
+        self.assertEqual([1, 2, 3], [r["bytes"] for r in parsed])
+        self.assertEqual([1, 1, 2], [r["digits"] for r in parsed])
+        self.assertEqual([1, 2, 3], [r["case"] for r in solved])
+        self.assertTrue(all(r["total"] >= r["solve"] for r in solved))
+        summary = stats.summary(slowest=2)
+        self.assertEqual(3, summary["cases"])
+        self.assertEqual(2, len(summary["slowest"]))
+        self.assertIn("p95", format_summary(summary))
+        self.assertEqual({}, stats._pending)
+
+    def test_parse_record_first(self):
+        from codejam.tokens import tokenize
+
+        class Flushed(StringIO):
+            flushed = ""
+
+            def flush(self):
+                self.flushed = self.getvalue()
+
+        tokens = tokenize(StringIO("3 1 22 333"))
+        f_json = Flushed()
+        stats = CaseStats(f_json=f_json)
+        parse = stats.parser(lambda t: t.int(), tokens)
+        seen = []
+
+        def solve(case):
+            seen.append(json.loads(f_json.flushed.splitlines()[-1]))
+            return case
+
+        solver = stats.timed(solve)
+        for pos in range(1, 4):
+            stats.solved(pos, solver(parse(tokens))[0], 0.0)
+        self.assertEqual([1, 2, 3], [r["case"] for r in seen])
+        self.assertTrue(all("parse" in r and "solve" not in r for r in seen))
+
+    def test_bounded(self):
+        from codejam.tokens import tokenize
+        tokens = tokenize(StringIO(" ".join(map(str, range(2000)))))
+        stats = CaseStats(slowest=3)
+        parse = stats.parser(lambda t: t.int(), tokens)
+        solver = stats.timed(_square)
+        for pos in range(1, 2001):
+            measures, result = solver(parse(tokens))
+            stats.solved(pos, measures, 0.0)
+        self.assertEqual(3, len(stats._slowest))
+        self.assertLess(len(stats._stages["solve"]._buckets), 1000)
+        summary = stats.summary()
+        self.assertEqual(2000, summary["cases"])
+        self.assertEqual(summary["total"]["max"], summary["slowest"][0]["total"])
+
+    def test_profile(self):
+        stats = CaseStats(profile=True)
+        solver = stats.timed(sorted)
+        self.assertEqual([1, 2, 3], solver([3, 1, 2])[1])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = stats.dump_profile(tmp, "solver")
+            self.assertTrue(os.path.isfile(path))
+        self.assertIsNone(CaseStats().profile_stats())
+
+    def test_memory(self):
+        from codejam.tokens import tokenize
+        tokens = tokenize(StringIO("1000 10"))
+        stats = CaseStats(memory=2)
+        parse = stats.parser(lambda t: [0] * t.int(), tokens)
+        solver = stats.timed(lambda case: len(list(range(100 * len(case)))))
+        records = []
+        tracemalloc.start()
+        try:
+            for pos in range(1, 3):
+                measures, result = solver(parse(tokens))
+                records.append(stats.solved(pos, measures, 0.0))
+        finally:
+            tracemalloc.stop()
+        first, second = records
+        self.assertGreaterEqual(first["parse_net"], 8000)
+        self.assertGreaterEqual(first["solve_peak"], 8 * 100000)
+        self.assertLess(abs(first["solve_net"]), 1000)
+        self.assertTrue(first["parse_sites"][0].startswith(__file__))
+        summary = stats.summary()
+        self.assertEqual([1, 2], [r["case"] for r in summary["memory"]["worst"]])
+        self.assertIn("largest peaks:", format_summary(summary))
+
+    def test_solver_name(self):
+        self.assertEqual("codejam_stats", solver_name(_square))
+        self.assertEqual("solver", solver_name(sorted))
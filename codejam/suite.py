@@ -0,0 +1,144 @@
+"""Run every solution on its practice files and check the outputs.
+
+The solutions are the ``YYYY_RoundXX/*.py`` modules that expose
+``parse_test_case``, ``do_single`` and ``NR``; their fixtures are the
+``{NR}-{small|large}-practice.in/out`` files next to them. The fixtures
+are solved concurrently by a pool of processes and every output line is
+checked as soon as it is written: a fixture stops at its first wrong case.
+
+    python -m codejam [2008_Round1A] [b_milkshakes] [--dimension large] [--jobs 4]
+"""
+import argparse
+import collections
+import glob
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from codejam import runner
+from codejam.output import FixtureComparator, FixtureMismatch
+from codejam.solvers import ROOT, load_solver
+
+DIMENSIONS = ["small", "large"]
+
+Fixture = collections.namedtuple("Fixture", ["problem", "path", "dimension", "f_in_name", "f_out_name"])
+Result = collections.namedtuple("Result", ["fixture", "status", "seconds", "detail"])
+
+
+def discover_solvers(root=ROOT):
+    """Paths (relative to ``root``) of the solution modules, sorted."""
+    paths = glob.glob(os.path.join(root, "[0-9][0-9][0-9][0-9]_Round*", "*.py"))
+    return sorted(os.path.relpath(p, root) for p in paths)
+
+
+def problem_name(path):
+    return os.path.splitext(path)[0].replace(os.sep, "/")
+
+
+def selected(path, patterns):
+    name = problem_name(path)
+    return not patterns or any(p.rstrip("/") in name.split("/") or p == name for p in patterns)
+
+
+def discover_fixtures(patterns=(), dimensions=DIMENSIONS, root=ROOT):
+    """The fixtures of the selected solutions that have both the in and out files."""
+    fixtures = []
+    for path in discover_solvers(root):
+        if not selected(path, patterns):
+            continue
+        solver = load_solver(os.path.join(root, path))
+        if not all(hasattr(solver, a) for a in ("NR", "parse_test_case", "do_single")):
+            continue
+        directory = os.path.dirname(os.path.join(root, path))
+        for dimension in dimensions:
+            names = [os.path.join(directory, runner.file_name(d, dimension, solver.NR)) for d in ("in", "out")]
+            if all(map(os.path.isfile, names)):
+                fixtures.append(Fixture(problem_name(path), os.path.join(root, path), dimension, *names))
+    return fixtures
+
+
+def run_fixture(fixture):
+    """Solve a fixture and compare the output: it runs in the pool workers."""
+    try:
+        solver = load_solver(fixture.path)
+        start = time.perf_counter()
+        with open(fixture.f_in_name) as f_in, open(fixture.f_out_name) as f_expected:
+            with FixtureComparator(f_expected) as f_out:
+                runner.do(f_in, f_out, solver.parse_test_case, solver.do_single)
+    except FixtureMismatch as e:
+        return Result(fixture, "FAIL", time.perf_counter() - start, str(e))
+    except Exception as e:
+        return Result(fixture, "ERROR", None, "{}: {}".format(type(e).__name__, e))
+    return Result(fixture, "PASS", time.perf_counter() - start, "")
+
+
+def run_fixtures(fixtures, jobs=None):
+    """Results in the fixtures order; ``jobs`` processes (all the cores by default)."""
+    if jobs == 1:
+        return [run_fixture(f) for f in fixtures]
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(run_fixture, fixtures))
+
+
+def format_table(results):
+    width = max([len(r.fixture.problem) for r in results] + [len("problem")])
+    lines = ["{:<{}}  {:<5}  {:<6}  {:>9}".format("problem", width, "size", "result", "time")]
+    for r in results:
+        seconds = "-" if r.seconds is None else "{:.3f}s".format(r.seconds)
+        line = "{:<{}}  {:<5}  {:<6}  {:>9}".format(r.fixture.problem, width, r.fixture.dimension, r.status, seconds)
+        lines.append((line + "  " + r.detail).rstrip())
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m codejam", description=__doc__.split("\n\n")[0])
+    parser.add_argument("problems", nargs="*", metavar="problem",
+                        help="round folder, module name or round/module (all if omitted)")
+    parser.add_argument("-d", "--dimension", choices=DIMENSIONS + ["all"], default="all")
+    parser.add_argument("-j", "--jobs", type=int, help="number of processes (default: all the cores)")
+    args = parser.parse_args(argv)
+    dimensions = DIMENSIONS if args.dimension == "all" else [args.dimension]
+    fixtures = discover_fixtures(args.problems, dimensions)
+    if not fixtures:
+        print("No fixture found")
+        return 1
+    start = time.perf_counter()
+    results = run_fixtures(fixtures, args.jobs)
+    print(format_table(results))
+    print("{} passed, {} failed in {:.3f}s".format(
+        sum(r.status == "PASS" for r in results), sum(r.status != "PASS" for r in results),
+        time.perf_counter() - start))
+    return 0 if all(r.status == "PASS" for r in results) else 1
+
+
+class Test(unittest.TestCase):
+    def test_discover_solvers(self):
+        solvers = discover_solvers()
+        self.assertIn(os.path.join("2008_Round1A", "b_milkshakes.py"), solvers)
+        self.assertIn(os.path.join("2009_Round1C", "a_all_your_bases.py"), solvers)
+
+    def test_discover_fixtures(self):
+        fixtures = discover_fixtures(["2009_Round1C"], ["small"])
+        self.assertEqual(["2009_Round1C/a_all_your_bases", "2009_Round1C/b_center_of_mass"],
+                         [f.problem for f in fixtures])
+        self.assertTrue(fixtures[0].f_in_name.endswith("A-small-practice.in"))
+        self.assertEqual(["2008_Round1A/b_milkshakes"],
+                         [f.problem for f in discover_fixtures(["2008_Round1A/b_milkshakes"], ["large"])])
+
+    def test_run_fixtures(self):
+        fixtures = discover_fixtures(["a_all_your_bases"])
+        results = run_fixtures(fixtures, 2)
+        self.assertEqual(["PASS", "PASS"], [r.status for r in results])
+        self.assertIn("PASS", format_table(results))
+
+    def test_run_fixture_fail(self):
+        fixture = discover_fixtures(["a_all_your_bases"], ["small"])[0]
+        result = run_fixture(fixture._replace(f_out_name=fixture.f_in_name))
+        self.assertEqual("FAIL", result.status)
+        self.assertTrue(result.detail.startswith("case 1 (line 1): "))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
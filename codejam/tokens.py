@@ -0,0 +1,269 @@
+"""Fast input layer for the parsers.
+
+A regular file is mapped in memory, any other input (pipes, ``StringIO``)
+is read in blocks of ``READ_SIZE`` bytes; the parsers pull whitespace
+separated tokens from it. There is no per-line ``readline()``/``split(" ")``,
+so repeated spaces and ``\\r\\n`` line endings are accepted too.
+"""
+import io
+import mmap
+import os
+import re
+import tempfile
+import unittest
+from io import StringIO
+
+_TOKEN = re.compile(rb"\s*(\S+)")
+
+
+BYTES_PER_INT = 12
+READ_SIZE = 1 << 20
+
+
+class Tokens(object):
+    """Tokens of ``data``; when ``reader`` is given ``data`` is just the current block.
+
+    ``reader(size)`` returns the next block of the input (empty at the
+    end). The blocks are appended to a ``bytearray`` and the consumed
+    bytes are deleted from its front when a new block is read: the ones
+    after ``hash_from()`` are fed to the hash before.
+    """
+
+    def __init__(self, data, pos=0, reader=None, read_size=READ_SIZE):
+        self._data = data if reader is None else bytearray(data)
+        self._pos = pos
+        self._offset = 0
+        self._hash = None
+        self._hashed = 0
+        self._reader = reader
+        self._read_size = read_size
+
+    @classmethod
+    def from_file(cls, f_in, read_size=READ_SIZE):
+        """Map ``f_in`` from its current position, or read it by blocks when it can't be mapped."""
+        try:
+            pos = f_in.tell()
+            data = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return cls(b"", reader=f_in.read, read_size=read_size)
+        return cls(data, pos)
+
+    def _more(self):
+        """Append the next block of the input to the data: False at the end of the input."""
+        if self._reader is None:
+            return False
+        block = self._reader(self._read_size)
+        if isinstance(block, str):
+            block = block.encode()
+        if not block:
+            self._reader = None
+            return False
+        self._feed()
+        del self._data[:self._pos]
+        self._data += block
+        self._offset += self._pos
+        self._pos = 0
+        return True
+
+    @property
+    def position(self):
+        """Offset in the input of the first byte not consumed yet."""
+        return self._offset + self._pos
+
+    def hash_from(self, h):
+        """Feed ``h.update()`` with the input consumed from here on, until ``hash_end()``."""
+        self._hash = h
+        self._hashed = self.position
+
+    def hash_end(self):
+        """Stop feeding the hash of ``hash_from()`` and return it."""
+        self._feed()
+        h, self._hash = self._hash, None
+        return h
+
+    def _feed(self):
+        if self._hash is not None and self._hashed < self.position:
+            self._hash.update(self._data[self._hashed - self._offset:self._pos])
+            self._hashed = self.position
+
+    def token(self):
+        while True:
+            m = _TOKEN.match(self._data, self._pos)
+            if m is not None and m.end() < len(self._data):
+                break
+            if not self._more():
+                if m is None:
+                    raise EOFError("No more tokens")
+                break
+        self._pos = m.end()
+        return m.group(1)
+
+    def word(self):
+        return self.token().decode()
+
+    def int(self):
+        return int(self.token())
+
+    def _split(self, n):
+        """The next ``n`` tokens and the end of the last one, without consuming them.
+
+        A chunk large enough for ``n`` tokens is read and split at once;
+        it is doubled when the guess was too small.
+        """
+        size = n * BYTES_PER_INT
+        while True:
+            while len(self._data) - self._pos < size and self._more():
+                pass
+            data, start = self._data, self._pos
+            end = min(start + size, len(data))
+            values = data[start:end].split(None, n)
+            if len(values) > n:
+                end -= len(values.pop())
+                break
+            if end == len(data) and self._reader is None:
+                if len(values) < n:
+                    raise EOFError("Less than {} tokens".format(n))
+                break
+            size *= 2
+        while data[end - 1:end].isspace():
+            end -= 1
+        return values, end
+
+    def ints(self, n):
+        """Read ``n`` integers in one go."""
+        if n <= 0:
+            return []
+        values, self._pos = self._split(n)
+        return list(map(int, values))
+
+    def span(self, n):
+        """Input bytes of the next ``n`` tokens, with the whitespace around them: for parsers like numpy's."""
+        if n <= 0:
+            return b""
+        _, end = self._split(n)
+        text, self._pos = bytes(self._data[self._pos:end]), end
+        return text
+
+    def readline(self):
+        """Rest of the current line: kept for the parsers that still work by lines."""
+        while True:
+            end = self._data.find(b"\n", self._pos)
+            if end >= 0 or not self._more():
+                break
+        end = len(self._data) if end < 0 else end + 1
+        line, self._pos = self._data[self._pos:end], end
+        return bytes(line).decode()
+
+
+def tokenize(f_in):
+    if isinstance(f_in, Tokens):
+        return f_in
+    return Tokens.from_file(f_in)
+
+
+class Test(unittest.TestCase):
+    def test_tokens(self):
+        tokens = tokenize(StringIO("3\r\n  1   -2 3\n\nabc\n"))
+        self.assertEqual(3, tokens.int())
+        self.assertEqual([1, -2, 3], tokens.ints(3))
+        self.assertEqual("abc", tokens.word())
+        with self.assertRaises(EOFError):
+            tokens.token()
+
+    def test_ints_chunks(self):
+        values = list(range(-1000000, 1000000, 999))
+        text = "  ".join(map(str, values)) + "\n7"
+        tokens = tokenize(StringIO(text))
+        self.assertEqual(values, tokens.ints(len(values)))
+        self.assertEqual(7, tokens.int())
+        tokens = tokenize(StringIO("1234567890123456789012345678901234567890 1"))
+        self.assertEqual([1234567890123456789012345678901234567890], tokens.ints(1))
+        self.assertEqual(1, tokens.int())
+
+    def test_ints_short(self):
+        tokens = tokenize(StringIO("1 2"))
+        with self.assertRaises(EOFError):
+            tokens.ints(3)
+        self.assertEqual([], tokens.ints(0))
+        self.assertEqual([1, 2], tokens.ints(2))
+
+    def test_span(self):
+        for read_size in [1, 3, 100]:
+            tokens = Tokens.from_file(StringIO("2\n1 -2\r\n 3\n4 5"), read_size)
+            self.assertEqual(2, tokens.int())
+            self.assertEqual(b"\n1 -2\r\n 3", tokens.span(3))
+            self.assertEqual(b"", tokens.span(0))
+            self.assertEqual(4, tokens.int())
+            with self.assertRaises(EOFError):
+                tokens.span(2)
+
+    def test_readline(self):
+        tokens = tokenize(StringIO("2\n1 2\nlast"))
+        self.assertEqual(2, tokens.int())
+        self.assertEqual("\n", tokens.readline())
+        self.assertEqual("1 2\n", tokens.readline())
+        self.assertEqual("last", tokens.readline())
+        self.assertEqual("", tokens.readline())
+
+    def test_position(self):
+        tokens = tokenize(StringIO("1\n10 20\n"))
+        tokens.int()
+        self.assertEqual(1, tokens.position)
+        tokens.ints(2)
+        self.assertEqual(7, tokens.position)
+
+    def test_small_blocks(self):
+        text = "3\r\n  1   -22 333\n\nabcdef\n" + " ".join(map(str, range(100))) + "\nlast line\n"
+        for read_size in [1, 2, 3, 7, 100]:
+            tokens = Tokens.from_file(StringIO(text), read_size)
+            self.assertEqual(3, tokens.int())
+            self.assertEqual([1, -22, 333], tokens.ints(3))
+            self.assertEqual("abcdef", tokens.word())
+            self.assertEqual(list(range(100)), tokens.ints(100))
+            self.assertEqual("\n", tokens.readline())
+            self.assertEqual("last line\n", tokens.readline())
+            with self.assertRaises(EOFError):
+                tokens.token()
+
+    def test_hash(self):
+        class Blocks(object):
+            def __init__(self):
+                self.blocks = []
+
+            def update(self, block):
+                self.blocks.append(block)
+
+        for read_size in [1, 2, 3, 100]:
+            tokens = Tokens.from_file(StringIO("1 22 333 4444 55555"), read_size)
+            tokens.int()
+            blocks = Blocks()
+            tokens.hash_from(blocks)
+            self.assertEqual([22, 333, 4444], [tokens.int() for _ in range(3)])
+            self.assertLessEqual(len(tokens._data), read_size + len(" 4444 "))
+            self.assertIs(blocks, tokens.hash_end())
+            self.assertEqual(b" 22 333 4444", b"".join(blocks.blocks))
+            tokens.int()
+            self.assertEqual(b" 22 333 4444", b"".join(blocks.blocks))
+
+    def test_same_tokens(self):
+        tokens = tokenize(StringIO("1"))
+        self.assertIs(tokens, tokenize(tokens))
+
+    def test_mapped_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            f_in_name = os.path.join(tmp, "input.in")
+            with open(f_in_name, "w") as f_in:
+                f_in.write("2\n1 2 3\nabc\n")
+            with open(f_in_name) as f_in:
+                f_in.readline()
+                tokens = tokenize(f_in)
+                self.assertIsInstance(tokens._data, mmap.mmap)
+                self.assertEqual([1, 2, 3], tokens.ints(3))
+                self.assertEqual("abc", tokens.word())
+                tokens._data.close()
+
+    def test_ints_blocks(self):
+        values = list(range(100000))
+        tokens = Tokens.from_file(StringIO(" ".join(map(str, values)) + " 7"), 1 << 10)
+        self.assertEqual(values, tokens.ints(len(values)))
+        self.assertEqual(7, tokens.int())